@@ -0,0 +1,145 @@
+"""
+Micro-batching for the recommender API.
+
+Concurrent requests are put on an asyncio queue. A single worker task takes
+the first waiting request, keeps collecting requests for at most
+``max_wait_ms`` (or until ``max_batch_size`` is reached) and hands the whole
+batch to ``process_batch`` in a worker thread, so N concurrent queries cost
+one model forward pass and one matrix multiply instead of N. When a batch
+fails, its requests are retried one at a time so only the ones that fail on
+their own get the error.
+"""
+import asyncio
+from collections import Counter
+
+
+class BatchStats:
+    """Queue-depth and batch-size counters reported by the health endpoint"""
+
+    def __init__(self):
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.retried_batches = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = Counter()
+
+    def record_batch(self, size):
+        self.batches += 1
+        self.items += size
+        self.batch_sizes[size] += 1
+
+    def as_dict(self, queue_depth):
+        return {
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+            "retried_batches": self.retried_batches,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+        }
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent requests into batches.
+
+    ``process_batch`` receives a list of requests and must return a list of
+    results in the same order. It runs in the default thread pool so the
+    event loop keeps accepting requests while a batch is being encoded.
+    """
+
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=5.0):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.stats = BatchStats()
+        self.queue = None
+        self.worker = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def metrics(self):
+        return self.stats.as_dict(self.queue_depth)
+
+    async def submit(self, request):
+        """Queue one request and wait for its result"""
+        if self.worker is None:
+            raise RuntimeError("MicroBatcher.start() must be called before submit()")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future))
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.queue.qsize())
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already waiting, then wait until the deadline
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Skip requests whose client went away while they were queued
+            batch = [(request, future) for request, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            self.stats.record_batch(len(batch))
+            try:
+                results = await loop.run_in_executor(None, self.process_batch, [r for r, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    results = [e]
+                else:
+                    # One bad request must not fail the others coalesced with it
+                    self.stats.retried_batches += 1
+                    results = await loop.run_in_executor(None, self._process_each, [r for r, _ in batch])
+
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    self.stats.errors += 1
+                    if not future.done():
+                        future.set_exception(result)
+                elif not future.done():
+                    future.set_result(result)
+
+    def _process_each(self, requests):
+        """Results of ``requests`` processed as batches of one, or the exception each raised"""
+        results = []
+        for request in requests:
+            try:
+                results.append(self.process_batch([request])[0])
+            except Exception as e:
+                results.append(e)
+        return results
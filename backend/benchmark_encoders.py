@@ -0,0 +1,97 @@
+"""
+Parity and latency report for the query encoder backends (encoders.py).
+
+Every backend encodes the job texts of the offline dataset and is compared
+against the reference "torch" backend:
+
+  - cosine agreement: cosine between each text's embedding and the reference one
+  - top-k agreement: overlap of the top-k jobs retrieved with the backend's
+    embeddings of job titles (used as queries) vs the reference embeddings
+  - latency: one query at a time (like an uncached /recommend request)
+  - throughput: texts/sec when encoding the dataset in batches
+
+Usage (from the backend directory, after `python encoders.py export`):
+    python benchmark_encoders.py
+    python benchmark_encoders.py --backends onnx-int8 --queries 100 --batch-size 64
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+from corpus import job_text
+from encoders import ENCODER_BACKENDS, load_encoder, warm_up
+from vector_index import normalize, top_k
+
+
+def timed_encode(encoder, texts, batch_size):
+    start = time.perf_counter()
+    vectors = encoder.encode(texts, batch_size=batch_size)
+    return normalize(np.asarray(vectors, dtype=np.float32)), time.perf_counter() - start
+
+
+def retrieve(queries, corpus, k):
+    return [set(top_k(scores, k).tolist()) for scores in queries @ corpus.T]
+
+
+def query_latencies(encoder, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        encoder.encode([query], batch_size=1)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=config.DATASET_PATH)
+    parser.add_argument("--backends", nargs="+", default=[b for b in ENCODER_BACKENDS if b != "torch"])
+    parser.add_argument("--queries", type=int, default=200, help="Job titles used as single queries")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.dataset)
+    texts = [job_text(record) for record in df.to_dict("records")]
+    queries = df["title"].fillna("").astype(str).tolist()[:args.queries]
+
+    reference = load_encoder("torch")
+    warm_up(reference, args.batch_size)
+    ref_corpus, ref_seconds = timed_encode(reference, texts, args.batch_size)
+    ref_queries, _ = timed_encode(reference, queries, args.batch_size)
+    ref_ids = retrieve(ref_queries, ref_corpus, args.top_k)
+    ref_latency = query_latencies(reference, queries)
+
+    print(f"{len(texts)} job texts, {len(queries)} queries, batch size {args.batch_size}\n")
+    print(f"{'backend':<10} {'cos mean':>9} {'cos min':>8} {'top-k agr':>10} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'texts/s':>8} {'speedup':>8}")
+    print(f"{'torch':<10} {1.0:>9.4f} {1.0:>8.4f} {1.0:>10.3f} {np.percentile(ref_latency, 50):>7.2f} "
+          f"{np.percentile(ref_latency, 95):>7.2f} {len(texts) / ref_seconds:>8.1f} {1.0:>7.2f}x")
+
+    for backend in args.backends:
+        try:
+            encoder = load_encoder(backend)
+        except (FileNotFoundError, ImportError) as e:
+            print(f"{backend:<10} skipped: {e}")
+            continue
+        warm_up(encoder, args.batch_size)
+        corpus, seconds = timed_encode(encoder, texts, args.batch_size)
+        query_vectors, _ = timed_encode(encoder, queries, args.batch_size)
+        cosines = (corpus * ref_corpus).sum(axis=1)
+
+        # Backend queries against the reference corpus: what /recommend sees
+        # when the store was built with the torch model
+        ids = retrieve(query_vectors, ref_corpus, args.top_k)
+        agreement = np.mean([len(a & b) / args.top_k for a, b in zip(ids, ref_ids)])
+        latency = query_latencies(encoder, queries)
+
+        print(f"{backend:<10} {cosines.mean():>9.4f} {cosines.min():>8.4f} {agreement:>10.3f} "
+              f"{np.percentile(latency, 50):>7.2f} {np.percentile(latency, 95):>7.2f} "
+              f"{len(texts) / seconds:>8.1f} {ref_seconds / seconds:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
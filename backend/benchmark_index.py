@@ -0,0 +1,95 @@
+"""
+Recall, latency and memory report for the approximate vector indexes.
+
+Every backend is compared against the exact FlatIndex on the same queries.
+Queries are corpus embeddings with Gaussian noise added, which keeps the
+benchmark independent from the sentence-transformer model. Memory is the
+size of the arrays every query scans (total, and per job without the fixed
+codebooks), compared with the float embeddings the flat index serves.
+
+Usage (from the backend directory):
+    python benchmark_index.py --queries 200 --top-k 10 --nprobe 1 2 4 8 16
+    python benchmark_index.py --pq-m 24 48 96 --rerank 0 100 200 400
+"""
+import argparse
+import time
+
+import numpy as np
+
+import config
+from embedding_store import open_store
+from vector_index import FlatIndex, IVFIndex, PQIndex, SQ8Index, normalize
+
+
+def make_queries(vectors, count, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), count, replace=len(vectors) < count)]
+    return normalize(picked + rng.normal(0, noise, picked.shape).astype(np.float32))
+
+
+def time_search(index, queries, top_k, **kwargs):
+    """Run one query at a time (like /recommend) and return ids and per-query latencies in ms"""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], top_k, **kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(found[0])
+    return ids, np.array(latencies)
+
+
+def recall(found_ids, exact_ids):
+    hits = [len(set(f.tolist()) & set(e.tolist())) / len(e) for f, e in zip(found_ids, exact_ids)]
+    return float(np.mean(hits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=config.EMBEDDING_STORE_PATH)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[config.PQ_M], help="PQ sub-quantizers (bytes/job)")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[config.QUANT_RERANK],
+                        help="Candidates re-scored with the float vectors (0: codes only)")
+    args = parser.parse_args()
+
+    vectors = open_store(args.store).vectors
+    queries = make_queries(vectors, args.queries, args.noise)
+    print(f"Corpus: {vectors.shape[0]} x {vectors.shape[1]}, {len(queries)} queries, top_k={args.top_k}")
+
+    flat = FlatIndex(vectors, normalized=True)
+    exact_ids, flat_ms = time_search(flat, queries, args.top_k)
+
+    start = time.perf_counter()
+    ivf = IVFIndex(vectors, nlist=args.nlist, normalized=True)
+    print(f"IVF build: nlist={ivf.nlist} in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    quantized = [SQ8Index(vectors, normalized=True)]
+    print(f"SQ8 build: {time.perf_counter() - start:.2f}s")
+    for m in args.pq_m:
+        start = time.perf_counter()
+        quantized.append(PQIndex(vectors, m=m, normalized=True))
+        print(f"PQ build: m={m} in {time.perf_counter() - start:.2f}s")
+    print()
+
+    print(f"{'backend':<24}{'recall@k':>10}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'MB':>8}{'bytes/job':>11}{'vs flat':>9}")
+    rows = [("flat", 1.0, flat_ms, flat)]
+    for nprobe in args.nprobe:
+        found, ms = time_search(ivf, queries, args.top_k, nprobe=nprobe)
+        rows.append((f"ivf nprobe={nprobe}", recall(found, exact_ids), ms, ivf))
+    for index in quantized:
+        label = index.name if index.name == "sq8" else f"pq m={index.m}"
+        for rerank in args.rerank:
+            index.rerank = rerank
+            found, ms = time_search(index, queries, args.top_k)
+            rows.append((f"{label} rerank={rerank}", recall(found, exact_ids), ms, index))
+    for name, rec, ms, index in rows:
+        print(f"{name:<24}{rec:>10.3f}{ms.mean():>10.3f}{np.percentile(ms, 50):>10.3f}{np.percentile(ms, 99):>10.3f}"
+              f"{index.nbytes / 1e6:>8.2f}{index.bytes_per_job:>11}{flat.bytes_per_job / index.bytes_per_job:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
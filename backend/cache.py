@@ -0,0 +1,78 @@
+"""
+Bounded LRU caches with a time-to-live for the recommender API.
+
+Two caches are used by main.py:
+  - query embeddings, keyed by the normalized query text
+  - ranked job ids, keyed by (normalized query text, top_k, filters)
+
+Entries are evicted least-recently-used first once ``max_entries`` is
+reached, and expire ``ttl_seconds`` after they were stored.
+"""
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_query(text):
+    """Canonical form of a query used as cache key: NFKC, lower case, collapsed whitespace"""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=300.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Return the cached value, or None on a miss or an expired entry"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if self.ttl and time.monotonic() >= expires_at:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,87 @@
+"""
+Runtime configuration for the recommender API.
+
+Every value can be overridden with an environment variable of the same name.
+"""
+import os
+
+# Sentence-transformer model used to encode queries and jobs
+MODEL_PATH = os.getenv("MODEL_PATH", "models/job_recommender_model")
+
+# Query encoder: "torch" (SentenceTransformer), "onnx" or "onnx-int8"
+# (ONNX exports made with `python encoders.py export`)
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
+# onnxruntime intra-op threads (0 = one per physical core)
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))
+
+# Corpus served by the API: "csv" (offline dataset + converted pickle)
+# or "db" (jobs.db + store maintained by incremental_indexer.py)
+CORPUS_SOURCE = os.getenv("CORPUS_SOURCE", "csv")
+
+# "csv" source: dataset and embedding store built by convert_embeddings.py
+DATASET_PATH = os.getenv("DATASET_PATH", "models/keejob_ml_dataset.csv")
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "models/job_embeddings.emb")
+
+# "db" source: scraper database, incremental store and the indexer's row map
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "../jobs.db")
+DB_EMBEDDING_STORE_PATH = os.getenv("DB_EMBEDDING_STORE_PATH", "models/jobs_db_embeddings.emb")
+INDEX_STATE_PATH = os.getenv("INDEX_STATE_PATH", "models/jobs_db_index.sqlite")
+
+# Vector index used by /recommend: "flat" (exact), "ivf" (approximate),
+# "sq8" (int8 codes) or "pq" (product quantization codes)
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "flat")
+
+# IVF index: number of clusters (0 = sqrt of the corpus size) and clusters probed per query
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+
+# Compressed indexes: PQ sub-quantizers (bytes per job, must divide the
+# embedding dimension) and rows re-scored exactly with the float vectors
+PQ_M = int(os.getenv("PQ_M", "48"))
+QUANT_RERANK = int(os.getenv("QUANT_RERANK", "200"))
+
+# Hybrid retrieval (mode="hybrid"): BM25 candidates fused with cosine scores
+HYBRID_LEXICAL_CANDIDATES = int(os.getenv("HYBRID_LEXICAL_CANDIDATES", "2000"))
+# Only score the BM25 candidates semantically (falls back to all rows when BM25 matches too few)
+HYBRID_PREFILTER = os.getenv("HYBRID_PREFILTER", "1") == "1"
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")  # "rrf" or "weighted"
+HYBRID_SEMANTIC_WEIGHT = float(os.getenv("HYBRID_SEMANTIC_WEIGHT", "0.5"))
+
+# Micro-batching of concurrent /recommend requests
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# Query embedding cache (normalized text -> embedding)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))
+
+# Result cache ((query, top_k, filters) -> ranked job ids), cleared when the corpus is reloaded
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "5000"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+
+# Hot reload: poll the corpus files every N seconds (0 disables the watcher)
+RELOAD_WATCH_INTERVAL = float(os.getenv("RELOAD_WATCH_INTERVAL", "0"))
+# When set, POST /admin/reload requires a matching X-Admin-Token header
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Neighbors kept per job in the kNN graph behind /jobs/{id}/similar (knn_graph.py)
+KNN_GRAPH_K = int(os.getenv("KNN_GRAPH_K", "50"))
+# Largest number of queries accepted by /recommend/batch
+RECOMMEND_BATCH_MAX_QUERIES = int(os.getenv("RECOMMEND_BATCH_MAX_QUERIES", "1000"))
+
+# Record the peak Python allocation of every /recommend stage with
+# tracemalloc (see stages.py); slow, for load-test memory runs only
+PROFILE_MEMORY = os.getenv("PROFILE_MEMORY", "0") == "1"
+
+
+def corpus_paths(source=None):
+    """Files whose modification means the corpus must be reloaded"""
+    source = source or CORPUS_SOURCE
+    if source == "db":
+        return [DB_EMBEDDING_STORE_PATH, INDEX_STATE_PATH, knn_graph_path(DB_EMBEDDING_STORE_PATH)]
+    return [EMBEDDING_STORE_PATH, DATASET_PATH, knn_graph_path(EMBEDDING_STORE_PATH)]
+
+
+def knn_graph_path(store_path):
+    """Neighbor ids file of the kNN graph of a store (see knn_graph.graph_paths)"""
+    return f"{os.path.splitext(store_path)[0]}.knn_ids.npy"
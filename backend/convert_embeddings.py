@@ -0,0 +1,38 @@
+"""
+Convert a pickled embedding matrix (models/job_embeddings.pkl) to the binary
+embedding store format read by the API.
+
+Usage (from the backend directory):
+    python convert_embeddings.py
+    python convert_embeddings.py --dtype float16 --output models/job_embeddings_f16.emb
+"""
+import argparse
+import pickle
+
+import numpy as np
+
+from embedding_store import DTYPE_CODES, write_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default="models/job_embeddings.pkl")
+    parser.add_argument("--output", default="models/job_embeddings.emb")
+    parser.add_argument("--model-id", default="job_recommender_model")
+    parser.add_argument("--dtype", default="float32", choices=sorted(DTYPE_CODES))
+    args = parser.parse_args()
+
+    with open(args.input, "rb") as f:
+        embeddings = np.asarray(pickle.load(f))
+
+    bad_rows = int((~np.isfinite(embeddings)).any(axis=1).sum())
+    if bad_rows:
+        print(f"Warning: {bad_rows} rows contain NaN/Inf values, they will be zeroed")
+
+    header = write_store(args.output, embeddings, model_id=args.model_id, dtype=args.dtype)
+    print(f"Wrote {header.count} x {header.dim} {header.dtype} embeddings "
+          f"(model: {header.model_id}) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
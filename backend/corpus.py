@@ -0,0 +1,99 @@
+"""
+Loading of the job corpus served by the API.
+
+A corpus is the job metadata (a DataFrame) plus one embedding row per job,
+in the same order. Two sources are supported (config.CORPUS_SOURCE):
+
+  - "csv": the offline dataset with the store built by convert_embeddings.py
+  - "db":  jobs.db with the store maintained by incremental_indexer.py
+"""
+import sqlite3
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import config
+from embedding_store import StoreHeader, open_store
+
+# Job fields concatenated into the text that is embedded for each job
+JOB_TEXT_FIELDS = ("title", "company", "sector", "description")
+
+JOB_COLUMNS = (
+    "title", "company", "location", "sector", "description", "salary",
+    "contract_type", "posted_date", "source_website", "job_url",
+)
+
+
+def job_text(record):
+    """Text embedded for one job (a mapping with the JOB_TEXT_FIELDS keys)"""
+    parts = [record.get(field) for field in JOB_TEXT_FIELDS]
+    return ". ".join(str(part).strip() for part in parts if part and str(part).strip())
+
+
+@dataclass
+class Corpus:
+    df: pd.DataFrame
+    embeddings: np.ndarray
+    header: StoreHeader
+    source: str
+    store_path: str
+    # Store row of each corpus row, None when they are the same
+    store_rows: np.ndarray = None
+
+
+def load_csv_corpus():
+    store = open_store(config.EMBEDDING_STORE_PATH)
+    df = pd.read_csv(config.DATASET_PATH)
+
+    if len(store) != len(df):
+        raise ValueError(f"Embedding store has {len(store)} rows but the dataset has {len(df)} jobs")
+
+    return Corpus(df=df, embeddings=store.vectors, header=store.header, source="csv",
+                  store_path=config.EMBEDDING_STORE_PATH)
+
+
+def load_db_corpus():
+    store = open_store(config.DB_EMBEDDING_STORE_PATH)
+
+    # Connections are closed explicitly: their context manager only ends the transaction
+    state = sqlite3.connect(f"file:{config.INDEX_STATE_PATH}?mode=ro", uri=True)
+    try:
+        compacting = state.execute("SELECT value FROM state WHERE key = 'compacting'").fetchone()
+        if compacting and int(compacting[0]):
+            # The row map and the store are being swapped (incremental_indexer.py compact)
+            raise RuntimeError("The embedding store is being compacted, retry once it is done")
+        live = state.execute(
+            "SELECT row, job_id FROM rows WHERE deleted = 0 AND row < ? ORDER BY row", (len(store),)
+        ).fetchall()
+    finally:
+        state.close()
+    rows = np.array([row for row, _ in live], dtype=np.int64)
+    job_ids = [job_id for _, job_id in live]
+
+    jobs = sqlite3.connect(f"file:{config.JOBS_DB_PATH}?mode=ro", uri=True)
+    try:
+        df = pd.read_sql_query(f"SELECT id, {', '.join(JOB_COLUMNS)} FROM jobs", jobs, index_col="id")
+    finally:
+        jobs.close()
+    df = df.reindex(job_ids).rename_axis("id").reset_index()
+
+    # Without tombstones the memory-mapped matrix is used as is; otherwise
+    # only live rows are gathered (run incremental_indexer.py --compact to
+    # get back to a zero-copy load)
+    if len(rows) == len(store):
+        embeddings, store_rows = store.vectors, None
+    else:
+        embeddings, store_rows = np.ascontiguousarray(store.vectors[rows]), rows
+
+    return Corpus(df=df, embeddings=embeddings, header=store.header, source="db",
+                  store_path=config.DB_EMBEDDING_STORE_PATH, store_rows=store_rows)
+
+
+def load_corpus(source=None):
+    source = source or config.CORPUS_SOURCE
+    if source == "csv":
+        return load_csv_corpus()
+    if source == "db":
+        return load_db_corpus()
+    raise ValueError(f"Unknown corpus source '{source}', expected 'csv' or 'db'")
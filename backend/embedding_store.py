@@ -0,0 +1,161 @@
+"""
+Binary embedding store.
+
+Layout of a store file (little-endian):
+
+    offset 0    magic        4s   b"JEMB"
+    offset 4    version      u16
+    offset 6    dtype code   u16  (0 = float32, 1 = float16)
+    offset 8    count        u64  number of vectors
+    offset 16   dim          u32  vector dimension
+    offset 20   model id len u16
+    offset 22   model id     utf-8, zero padded up to HEADER_SIZE
+    HEADER_SIZE matrix       count x dim, C-contiguous, L2-normalized
+
+Vectors are sanitized (NaN/Inf -> 0) and normalized once when the store is
+written. Readers open the matrix with np.memmap, so several uvicorn workers
+share the same pages through the OS page cache instead of each holding a
+private copy.
+"""
+import os
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+
+from vector_index import normalize
+
+MAGIC = b"JEMB"
+VERSION = 1
+HEADER_SIZE = 256
+HEADER_FORMAT = "<4sHHQIH"
+MAX_MODEL_ID_BYTES = HEADER_SIZE - struct.calcsize(HEADER_FORMAT)
+
+DTYPE_CODES = {"float32": 0, "float16": 1}
+DTYPE_NAMES = {code: name for name, code in DTYPE_CODES.items()}
+
+
+@dataclass
+class StoreHeader:
+    dim: int
+    dtype: str
+    count: int
+    model_id: str
+
+    def pack(self):
+        model_id = self.model_id.encode("utf-8")
+        if len(model_id) > MAX_MODEL_ID_BYTES:
+            raise ValueError(f"Model id is longer than {MAX_MODEL_ID_BYTES} bytes: {self.model_id}")
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, DTYPE_CODES[self.dtype],
+                             self.count, self.dim, len(model_id)) + model_id
+        return header.ljust(HEADER_SIZE, b"\0")
+
+    @classmethod
+    def unpack(cls, data):
+        magic, version, dtype_code, count, dim, id_len = struct.unpack_from(HEADER_FORMAT, data)
+        if magic != MAGIC:
+            raise ValueError("Not an embedding store file (bad magic)")
+        if version != VERSION:
+            raise ValueError(f"Unsupported embedding store version {version}")
+        offset = struct.calcsize(HEADER_FORMAT)
+        model_id = data[offset:offset + id_len].decode("utf-8")
+        return cls(dim=dim, dtype=DTYPE_NAMES[dtype_code], count=count, model_id=model_id)
+
+
+class EmbeddingStore:
+    """Read-only view of a store file; ``vectors`` is a memory-mapped (count, dim) matrix"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.header = StoreHeader.unpack(f.read(HEADER_SIZE))
+        if self.header.count:
+            self.vectors = np.memmap(path, dtype=self.header.dtype, mode="r", offset=HEADER_SIZE,
+                                     shape=(self.header.count, self.header.dim))
+        else:
+            # np.memmap cannot map a zero-length region
+            self.vectors = np.empty((0, self.header.dim), dtype=self.header.dtype)
+
+    def __len__(self):
+        return self.header.count
+
+    @property
+    def shape(self):
+        return self.vectors.shape
+
+
+def write_store(path, vectors, model_id, dtype="float32"):
+    """
+    Sanitize, normalize and write ``vectors`` to a new store file.
+
+    The file is written next to ``path`` and renamed into place, so readers
+    never see a partially written store.
+    """
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported dtype '{dtype}', expected one of {sorted(DTYPE_CODES)}")
+    matrix = np.ascontiguousarray(normalize(vectors).astype(dtype))
+    header = StoreHeader(dim=matrix.shape[1], dtype=dtype, count=matrix.shape[0], model_id=model_id)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.pack())
+        f.write(matrix.tobytes())
+    os.replace(tmp_path, path)
+    return header
+
+
+def open_store(path):
+    return EmbeddingStore(path)
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        return StoreHeader.unpack(f.read(HEADER_SIZE))
+
+
+def append_to_store(path, vectors, model_id):
+    """
+    Append normalized ``vectors`` to an existing store (created if missing).
+
+    The rows are written after the last committed row and the header count is
+    updated last, so a reader that opened the store earlier keeps a valid view
+    of the rows it knows about. Returns the index of the first appended row.
+    """
+    vectors = normalize(vectors)
+    if not os.path.exists(path):
+        write_store(path, vectors, model_id=model_id)
+        return 0
+
+    with open(path, "r+b") as f:
+        header = StoreHeader.unpack(f.read(HEADER_SIZE))
+        if header.model_id != model_id:
+            raise ValueError(f"Store was built with model '{header.model_id}', not '{model_id}'")
+        if vectors.shape[1] != header.dim:
+            raise ValueError(f"Store dimension is {header.dim}, got vectors of dimension {vectors.shape[1]}")
+
+        first_row = header.count
+        row_bytes = header.dim * np.dtype(header.dtype).itemsize
+        f.seek(HEADER_SIZE + first_row * row_bytes)
+        f.write(np.ascontiguousarray(vectors.astype(header.dtype)).tobytes())
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+        header.count += len(vectors)
+        f.seek(0)
+        f.write(header.pack())
+        f.flush()
+        os.fsync(f.fileno())
+    return first_row
+
+
+def truncate_store(path, count):
+    """Drop every row after the first ``count`` rows (used to roll back an interrupted append)"""
+    with open(path, "r+b") as f:
+        header = StoreHeader.unpack(f.read(HEADER_SIZE))
+        if count >= header.count:
+            return
+        header.count = count
+        f.seek(0)
+        f.write(header.pack())
+        f.truncate(HEADER_SIZE + count * header.dim * np.dtype(header.dtype).itemsize)
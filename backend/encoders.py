@@ -0,0 +1,189 @@
+"""
+Query encoders for the recommender API (config.ENCODER_BACKEND).
+
+  - "torch":     the sentence-transformer model as trained (reference)
+  - "onnx":      the same transformer exported to ONNX, run with onnxruntime
+  - "onnx-int8": the ONNX export with dynamically quantized int8 weights
+
+The ONNX backends tokenize with the model's tokenizer.json and apply the
+pooling described in 1_Pooling/config.json (mean pooling for this model)
+and the Normalize module listed in modules.json, so they return the same
+embeddings as SentenceTransformer.encode() up to numerical error (see
+benchmark_encoders.py for the parity check).
+
+Export the model once, then select the backend with ENCODER_BACKEND:
+    python encoders.py export            # writes <model>/onnx/model.onnx and model_int8.onnx
+    ENCODER_BACKEND=onnx-int8 uvicorn main:app
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import config
+
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+class TorchEncoder:
+    name = "torch"
+
+    def __init__(self, model_path):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_path)
+
+    def encode(self, texts, batch_size=32):
+        return self.model.encode(texts, batch_size=batch_size)
+
+
+class OnnxEncoder:
+    """Transformer exported to ONNX + the pooling/normalization modules of the model directory"""
+
+    def __init__(self, model_path, onnx_path, threads=0, name="onnx"):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.name = name
+        with open(os.path.join(model_path, "sentence_bert_config.json")) as f:
+            self.max_seq_length = json.load(f).get("max_seq_length", 256)
+        with open(os.path.join(model_path, "1_Pooling", "config.json")) as f:
+            pooling = json.load(f)
+        if pooling.get("pooling_mode_cls_token"):
+            self.pooling = "cls"
+        elif pooling.get("pooling_mode_max_tokens"):
+            self.pooling = "max"
+        elif pooling.get("pooling_mode_mean_tokens"):
+            self.pooling = "mean"
+        else:
+            raise ValueError(f"Unsupported pooling configuration: {pooling}")
+        with open(os.path.join(model_path, "modules.json")) as f:
+            self.normalize = any(m["type"].endswith("Normalize") for m in json.load(f))
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=32):
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Like SentenceTransformer, batch texts of similar length to limit padding
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        out = [None] * len(texts)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            for i, vector in zip(idx, self.encode_batch([texts[i] for i in idx])):
+                out[i] = vector
+        return np.stack(out)
+
+    def encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        mask = feeds["attention_mask"][:, :, None].astype(np.float32)
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        elif self.pooling == "max":
+            pooled = np.where(mask > 0, hidden, -1e9).max(axis=1)
+        else:
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+
+def onnx_paths(model_path):
+    directory = os.path.join(model_path, "onnx")
+    return os.path.join(directory, "model.onnx"), os.path.join(directory, "model_int8.onnx")
+
+
+def load_encoder(backend=None, model_path=None, threads=None):
+    backend = backend or config.ENCODER_BACKEND
+    model_path = model_path or config.MODEL_PATH
+    threads = config.ENCODER_THREADS if threads is None else threads
+    if backend == "torch":
+        return TorchEncoder(model_path)
+    if backend in ("onnx", "onnx-int8"):
+        fp32_path, int8_path = onnx_paths(model_path)
+        path = int8_path if backend == "onnx-int8" else fp32_path
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found, run `python encoders.py export` first")
+        return OnnxEncoder(model_path, path, threads=threads, name=backend)
+    raise ValueError(f"Unknown encoder backend {backend!r} (expected one of {', '.join(ENCODER_BACKENDS)})")
+
+
+def warm_up(encoder, batch_size=32):
+    """Run a few batches so the first requests don't pay for allocation and graph setup"""
+    start = time.perf_counter()
+    encoder.encode(["warm up"], batch_size=batch_size)
+    encoder.encode(["python developer with django experience in tunis"] * batch_size, batch_size=batch_size)
+    return time.perf_counter() - start
+
+
+def export_onnx(model_path, output_path, opset=14):
+    """Export the transformer of a sentence-transformer model (token embeddings only) to ONNX"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModel.from_pretrained(model_path)
+    model.eval()
+    sample = tokenizer(["export sample", "a longer export sample sentence"], padding=True, return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in names),
+            output_path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    return output_path
+
+
+def quantize_onnx(input_path, output_path):
+    """Dynamic int8 quantization: int8 weights, activations quantized on the fly"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(input_path, output_path, weight_type=QuantType.QInt8)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--model", default=config.MODEL_PATH)
+    parser.add_argument("--no-int8", action="store_true", help="Skip the int8 quantized model")
+    args = parser.parse_args()
+
+    fp32_path, int8_path = onnx_paths(args.model)
+    start = time.perf_counter()
+    export_onnx(args.model, fp32_path)
+    print(f"Exported {fp32_path} ({os.path.getsize(fp32_path) / 1e6:.1f} MB) in {time.perf_counter() - start:.1f}s")
+    if not args.no_int8:
+        quantize_onnx(fp32_path, int8_path)
+        print(f"Quantized {int8_path} ({os.path.getsize(int8_path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
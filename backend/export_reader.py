@@ -0,0 +1,80 @@
+"""
+Streaming reader for the NDJSON exports written by the scraper's
+NdjsonExportPipeline (exports/<spider>-00001.ndjson[.gz|.zst], ...).
+
+Files are decompressed and parsed line by line, so an export of any size
+is read in constant memory:
+
+    for job in iter_ndjson("../exports"):
+        ...
+
+The backend is deployed and run on its own, without the scraper package
+(and Scrapy) on its path, so ``open_export`` repeats the reading side of
+job_scraper/ndjson.py ``open_part``: keep the two in sync.
+"""
+import glob
+import gzip
+import json
+import os
+
+try:
+    import zstandard
+except ImportError:  # Only needed for .zst exports
+    zstandard = None
+
+EXPORT_SUFFIXES = (".ndjson", ".ndjson.gz", ".ndjson.zst")
+
+# Raised by a compressed part that is truncated or still being written
+READ_ERRORS = (EOFError, OSError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def export_files(source):
+    """Export parts for ``source``: a file, a directory or a glob pattern, in name order"""
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    elif os.path.isfile(source):
+        return [source]
+    else:
+        paths = glob.glob(source)
+    return sorted(path for path in paths if path.endswith(EXPORT_SUFFIXES))
+
+
+def open_export(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"Reading {path} requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+    return open(path, "rb")
+
+
+def iter_lines(f, block_size=1024 * 1024):
+    pending = b""
+    for block in iter(lambda: f.read(block_size), b""):
+        lines = (pending + block).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_ndjson(source):
+    """Yield every exported item (a dict) of ``source``"""
+    for path in export_files(source):
+        with open_export(path) as f:
+            try:
+                for line in iter_lines(f):
+                    if not line.strip():
+                        continue
+                    try:
+                        item = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        # A line cut short by a crash: the lines after it are intact
+                        print(f"Skipping a malformed line of {path}: {e}")
+                        continue
+                    yield item
+            except READ_ERRORS as e:
+                # A crawl killed mid-write, or a rotated part still being
+                # written, ends with a truncated gzip member or zstd frame
+                print(f"Skipping the rest of {path}: {e}")
@@ -0,0 +1,81 @@
+"""
+Precomputed facet indexes for filtered search.
+
+For every facet (sector, location, contract type, source) the index keeps
+one sorted int32 array of row ids per distinct value. A filter such as
+``{"contract_type": ["CDI"], "location": ["Sfax"]}`` is resolved by taking
+the union of the arrays within a facet and intersecting across facets,
+smallest first. The resulting candidate rows are the only rows scored, so a
+selective filter makes a query cheaper instead of over-fetching.
+"""
+import unicodedata
+
+import numpy as np
+
+# API filter name -> job metadata column
+FACETS = {
+    "sector": "sector",
+    "location": "location",
+    "contract_type": "contract_type",
+    "source": "source_website",
+}
+
+
+def normalize_facet_value(value):
+    return " ".join(unicodedata.normalize("NFKC", str(value)).casefold().split())
+
+
+class FacetIndex:
+    def __init__(self, metadata, facets=FACETS):
+        self.size = len(metadata)
+        self.postings = {}
+        for name, column_name in facets.items():
+            self.postings[name] = self._build(metadata.column(column_name)) if column_name in metadata else {}
+
+    @staticmethod
+    def _build(column):
+        """Posting lists from a metadata column's codes; codes with the same normalized value are merged"""
+        order = np.argsort(column.codes, kind="stable")
+        starts = np.searchsorted(column.codes[order], np.arange(len(column.values) + 1))
+        parts = {}
+        for code, value in enumerate(column.values):
+            value = normalize_facet_value(value)
+            if value:
+                parts.setdefault(value, []).append(order[starts[code]:starts[code + 1]])
+        return {
+            value: (rows[0] if len(rows) == 1 else np.sort(np.concatenate(rows))).astype(np.int32)
+            for value, rows in parts.items()
+        }
+
+    def value_counts(self, name):
+        return {value: len(rows) for value, rows in sorted(self.postings[name].items())}
+
+    def candidates(self, filters):
+        """
+        Sorted row ids matching every facet in ``filters`` (facet name -> accepted values).
+
+        Returns None when there is no filter, i.e. every row is a candidate.
+        """
+        filters = {name: values for name, values in (filters or {}).items() if values}
+        if not filters:
+            return None
+
+        unknown = set(filters) - set(self.postings)
+        if unknown:
+            raise ValueError(f"Unknown filter(s) {sorted(unknown)}, expected some of {sorted(self.postings)}")
+
+        per_facet = []
+        for name, values in filters.items():
+            postings = self.postings[name]
+            arrays = [postings[v] for v in map(normalize_facet_value, values) if v in postings]
+            if not arrays:
+                return np.empty(0, dtype=np.int32)
+            per_facet.append(arrays[0] if len(arrays) == 1 else np.unique(np.concatenate(arrays)))
+
+        per_facet.sort(key=len)
+        result = per_facet[0]
+        for rows in per_facet[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, rows, assume_unique=True)
+        return result
@@ -0,0 +1,345 @@
+"""
+Incremental embedding indexer for jobs scraped into jobs.db.
+
+Only the delta since the previous run is encoded:
+
+  - new jobs are found with ``jobs.id > last_job_id``
+  - updated and deleted jobs are read from a change log (``job_changes``)
+    filled by triggers that this script installs on the ``jobs`` table
+
+New and changed jobs are encoded in batches with the local model and
+appended to the embedding store. The row a job used before it changed or
+was deleted is tombstoned in the indexer state, and the API skips it.
+Near-duplicates marked by the scraper (``jobs.duplicate_of``, see
+job_scraper/dedup.py) are never encoded, and a job marked after it was
+indexed is tombstoned like a deleted one. ``--compact`` rewrites the store
+without tombstoned rows.
+
+``--import-export`` first loads jobs from NDJSON exports of the scraper
+(e.g. a crawl run on another machine) into jobs.db, streaming them in
+batches; they are then indexed like any other new job.
+
+When the store has a kNN graph (knn_graph.py, or ``--knn-graph`` to build
+it), the graph is updated with the appended rows at the end of every run
+and rebuilt after a compaction, which renumbers rows.
+
+The indexer state (row -> job id map and cursors) lives in its own SQLite
+file next to the store (config.INDEX_STATE_PATH).
+
+Usage (from the backend directory):
+    python incremental_indexer.py
+    python incremental_indexer.py --batch-size 128 --compact
+    python incremental_indexer.py --import-export ../exports
+    python incremental_indexer.py --knn-graph
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+
+from sentence_transformers import SentenceTransformer
+
+import config
+from corpus import JOB_COLUMNS, JOB_TEXT_FIELDS, job_text
+from embedding_store import append_to_store, open_store, read_header, truncate_store, write_store
+from export_reader import iter_ndjson
+from knn_graph import graph_paths, refresh_graph
+
+STATE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rows (
+        row INTEGER PRIMARY KEY,
+        job_id INTEGER NOT NULL,
+        content_hash TEXT NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS rows_live_job_id ON rows (job_id) WHERE deleted = 0;
+    CREATE TABLE IF NOT EXISTS state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+"""
+
+CHANGE_LOG_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS job_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id INTEGER NOT NULL,
+        op TEXT NOT NULL
+    );
+    CREATE TRIGGER IF NOT EXISTS jobs_log_update
+    AFTER UPDATE OF {', '.join(JOB_TEXT_FIELDS)} ON jobs
+    BEGIN
+        INSERT INTO job_changes (job_id, op) VALUES (NEW.id, 'update');
+    END;
+    CREATE TRIGGER IF NOT EXISTS jobs_log_duplicate
+    AFTER UPDATE OF duplicate_of ON jobs
+    BEGIN
+        INSERT INTO job_changes (job_id, op) VALUES (NEW.id, 'update');
+    END;
+    CREATE TRIGGER IF NOT EXISTS jobs_log_delete
+    AFTER DELETE ON jobs
+    BEGIN
+        INSERT INTO job_changes (job_id, op) VALUES (OLD.id, 'delete');
+    END;
+"""
+
+# Near-duplicates are left out: they are neither encoded nor kept live
+SELECT_JOBS = f"SELECT id, {', '.join(JOB_TEXT_FIELDS)} FROM jobs WHERE duplicate_of IS NULL"
+
+IMPORT_COLUMNS = JOB_COLUMNS + ("scraped_at", "duplicate_of")
+IMPORT_JOBS = (
+    f"INSERT OR IGNORE INTO jobs ({', '.join(IMPORT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(IMPORT_COLUMNS))})"
+)
+
+
+def dict_factory(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class IncrementalIndexer:
+    def __init__(self, jobs_db, store_path, state_path, model_path, batch_size=64):
+        self.store_path = store_path
+        self.model_path = model_path
+        self.model_id = os.path.basename(os.path.normpath(model_path))
+        self.batch_size = batch_size
+        self.model = None
+
+        self.jobs = sqlite3.connect(jobs_db)
+        self.jobs.row_factory = dict_factory
+        columns = {row["name"] for row in self.jobs.execute("PRAGMA table_info(jobs)")}
+        # The scraper creates the jobs table on its first crawl; until then
+        # there is nothing to index nor to install the change log triggers on
+        self.has_jobs_table = bool(columns)
+        if columns and "duplicate_of" not in columns:
+            # Database scraped before near-duplicate detection
+            self.jobs.execute("ALTER TABLE jobs ADD COLUMN duplicate_of TEXT")
+        if self.has_jobs_table:
+            self.jobs.executescript(CHANGE_LOG_SCHEMA)
+
+        self.state = sqlite3.connect(state_path)
+        self.state.executescript(STATE_SCHEMA)
+
+    def close(self):
+        self.jobs.close()
+        self.state.close()
+
+    # State helpers
+
+    def get_state(self, key, default=0):
+        row = self.state.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else default
+
+    def set_state(self, key, value):
+        self.state.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def row_count(self):
+        return self.state.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+
+    def recover(self):
+        """
+        Finish a compaction interrupted after its commit, then drop store rows
+        appended by a run that crashed before committing its state.
+        """
+        compacted_path = f"{self.store_path}.compacted"
+        if self.get_state("compacting"):
+            # The renumbered rows are committed: the compacted store goes with them
+            if os.path.exists(compacted_path):
+                print("Finishing an interrupted compaction")
+                os.replace(compacted_path, self.store_path)
+            with self.state:
+                self.set_state("compacting", 0)
+        elif os.path.exists(compacted_path):
+            os.remove(compacted_path)
+        if os.path.exists(self.store_path):
+            committed = self.row_count()
+            if read_header(self.store_path).count > committed:
+                print(f"Rolling back uncommitted store rows after row {committed}")
+                truncate_store(self.store_path, committed)
+
+    # Indexing
+
+    def encode(self, texts):
+        if self.model is None:
+            self.model = SentenceTransformer(self.model_path)
+        return self.model.encode(texts, batch_size=self.batch_size)
+
+    def index_jobs(self, jobs):
+        """Encode ``jobs`` (dicts from SELECT_JOBS), append them to the store and record their rows"""
+        if not jobs:
+            return
+        texts = [job_text(job) for job in jobs]
+        first_row = append_to_store(self.store_path, self.encode(texts), model_id=self.model_id)
+        self.state.executemany(
+            "INSERT INTO rows (row, job_id, content_hash) VALUES (?, ?, ?)",
+            [(first_row + i, job["id"], content_hash(text)) for i, (job, text) in enumerate(zip(jobs, texts))],
+        )
+
+    def tombstone(self, job_ids):
+        self.state.executemany("UPDATE rows SET deleted = 1 WHERE job_id = ? AND deleted = 0",
+                               [(job_id,) for job_id in job_ids])
+
+    def apply_changes(self):
+        """Re-embed updated jobs and tombstone deleted ones; returns (updated, deleted) counts"""
+        last_seq = self.get_state("last_change_seq")
+        changes = self.jobs.execute(
+            "SELECT seq, job_id FROM job_changes WHERE seq > ? ORDER BY seq", (last_seq,)
+        ).fetchall()
+        if not changes:
+            return 0, 0
+
+        job_ids = sorted({change["job_id"] for change in changes})
+        current = {}
+        for start in range(0, len(job_ids), 500):
+            chunk = job_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for job in self.jobs.execute(f"{SELECT_JOBS} AND id IN ({placeholders})", chunk):
+                current[job["id"]] = job
+
+        deleted = [job_id for job_id in job_ids if job_id not in current]
+        changed = []
+        last_job_id = self.get_state("last_job_id")
+        for job_id, job in current.items():
+            live = self.state.execute(
+                "SELECT content_hash FROM rows WHERE job_id = ? AND deleted = 0", (job_id,)
+            ).fetchone()
+            # Jobs above the cursor are picked up as new jobs; below it, a job
+            # without a live row is a near-duplicate that was unmarked
+            if live is None and job_id > last_job_id:
+                continue
+            if live is not None and live[0] == content_hash(job_text(job)):
+                continue
+            changed.append(job)
+
+        self.tombstone(deleted + [job["id"] for job in changed])
+        for start in range(0, len(changed), self.batch_size):
+            self.index_jobs(changed[start:start + self.batch_size])
+
+        last_seq = changes[-1]["seq"]
+        self.set_state("last_change_seq", last_seq)
+        self.state.commit()
+        self.jobs.execute("DELETE FROM job_changes WHERE seq <= ?", (last_seq,))
+        self.jobs.commit()
+        return len(changed), len(deleted)
+
+    def import_export(self, source, batch_size=1000):
+        """Insert the jobs of an NDJSON export into jobs.db (known job URLs are ignored)"""
+        if not self.has_jobs_table:
+            raise RuntimeError("jobs.db has no jobs table: run a crawl first so the scraper creates it")
+        imported = total = 0
+        batch = []
+        for job in iter_ndjson(source):
+            batch.append(tuple(job.get(column) for column in IMPORT_COLUMNS))
+            if len(batch) >= batch_size:
+                imported += self.insert_jobs(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            imported += self.insert_jobs(batch)
+            total += len(batch)
+        print(f"Imported {imported} of {total} exported jobs from {source}")
+        return imported
+
+    def insert_jobs(self, rows):
+        with self.jobs:
+            cursor = self.jobs.executemany(IMPORT_JOBS, rows)
+        return cursor.rowcount
+
+    def index_new_jobs(self):
+        """Encode jobs added since the last run, one committed batch at a time"""
+        last_job_id = self.get_state("last_job_id")
+        cursor = self.jobs.execute(f"{SELECT_JOBS} AND id > ? ORDER BY id", (last_job_id,))
+        added = 0
+        while True:
+            batch = cursor.fetchmany(self.batch_size)
+            if not batch:
+                break
+            self.index_jobs(batch)
+            self.set_state("last_job_id", batch[-1]["id"])
+            self.state.commit()
+            added += len(batch)
+        return added
+
+    def compact(self):
+        """
+        Rewrite the store without tombstoned rows and renumber the row map.
+
+        The compacted store is written next to the current one, the new row
+        map is committed together with a ``compacting`` marker, and only
+        then is the store swapped in and the marker cleared. The API refuses
+        to load a corpus while the marker is set, so it never pairs the
+        renumbered rows with the old store or the other way round; recover()
+        finishes a compaction interrupted after the commit.
+        """
+        live = self.state.execute(
+            "SELECT row, job_id, content_hash FROM rows WHERE deleted = 0 ORDER BY row"
+        ).fetchall()
+        store = open_store(self.store_path)
+        rows = [row for row, _, _ in live]
+        compacted_path = f"{self.store_path}.compacted"
+        write_store(compacted_path, store.vectors[rows], model_id=store.header.model_id,
+                    dtype=store.header.dtype)
+        with self.state:
+            self.state.execute("DELETE FROM rows")
+            self.state.executemany(
+                "INSERT INTO rows (row, job_id, content_hash) VALUES (?, ?, ?)",
+                [(new_row, job_id, digest) for new_row, (_, job_id, digest) in enumerate(live)],
+            )
+            self.set_state("compacting", 1)
+        os.replace(compacted_path, self.store_path)
+        with self.state:
+            self.set_state("compacting", 0)
+        return len(store) - len(live)
+
+    def update_graph(self, rebuild=False):
+        """Bring the store's kNN graph up to date, tombstoned rows excluded from the neighbors"""
+        dead = [row for row, in self.state.execute("SELECT row FROM rows WHERE deleted = 1")]
+        refresh_graph(self.store_path, dead=dead, rebuild=rebuild)
+
+    def run(self, compact=False, knn_graph=False):
+        start = time.perf_counter()
+        self.recover()
+        if not self.has_jobs_table:
+            print("jobs.db has no jobs table yet (no crawl has written to it), nothing to index")
+            return
+        updated, deleted = self.apply_changes()
+        added = self.index_new_jobs()
+        removed = self.compact() if compact and os.path.exists(self.store_path) else 0
+        print(f"Indexed {added} new jobs, re-embedded {updated} changed jobs, "
+              f"tombstoned {deleted} deleted jobs in {time.perf_counter() - start:.2f}s")
+        if removed:
+            print(f"Compacted store: removed {removed} tombstoned rows")
+        has_graph = os.path.exists(graph_paths(self.store_path)[0])
+        if os.path.exists(self.store_path) and (knn_graph or has_graph):
+            self.update_graph(rebuild=bool(removed) or not has_graph)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs-db", default=config.JOBS_DB_PATH)
+    parser.add_argument("--store", default=config.DB_EMBEDDING_STORE_PATH)
+    parser.add_argument("--state", default=config.INDEX_STATE_PATH)
+    parser.add_argument("--model", default=config.MODEL_PATH)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--compact", action="store_true", help="Drop tombstoned rows from the store")
+    parser.add_argument("--import-export", metavar="PATH",
+                        help="Load an NDJSON export (file, directory or glob) into jobs.db first")
+    parser.add_argument("--knn-graph", action="store_true",
+                        help="Build the kNN graph of similar jobs if the store does not have one yet")
+    args = parser.parse_args()
+
+    indexer = IncrementalIndexer(args.jobs_db, args.store, args.state, args.model, batch_size=args.batch_size)
+    try:
+        if args.import_export:
+            indexer.import_export(args.import_export)
+        indexer.run(compact=args.compact, knn_graph=args.knn_graph)
+    finally:
+        indexer.close()
+
+
+if __name__ == "__main__":
+    main()
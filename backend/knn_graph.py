@@ -0,0 +1,290 @@
+"""
+Precomputed job-to-job kNN graph for /jobs/{id}/similar.
+
+For every row of an embedding store the graph keeps the ids and cosine
+scores of its ``k`` nearest rows, as two .npy files next to the store:
+
+    models/job_embeddings.knn_ids.npy      int32   (count, k), -1 = no neighbor
+    models/job_embeddings.knn_scores.npy   float32 (count, k), best first
+    models/job_embeddings.knn_meta.json    store rows the graph was built from
+
+"Similar jobs" is then a row lookup instead of an encode plus a full scan.
+The graph is built offline (O(count^2) inner products, in blocks) and
+updated incrementally when rows are appended to the store (O(count x new)):
+the new rows get their neighbor lists, and existing lists are merged with
+the new rows that are closer than their current neighbors. Neighbors that
+were deleted (tombstoned rows of the db corpus) are dropped; a row left
+with fewer than half its neighbors is recomputed. incremental_indexer.py
+updates the graph after every run when it exists.
+
+The meta file records the model id, dimension and a digest of the store
+rows the graph covers. A graph whose store was rebuilt since (re-converted
+or re-encoded, even with the same number of rows) is not served, and it is
+rebuilt instead of updated.
+
+Usage (from the backend directory):
+    python knn_graph.py build                      # graph of config.EMBEDDING_STORE_PATH
+    python knn_graph.py build --store models/jobs_db_embeddings.emb --k 50
+    python knn_graph.py update --store models/jobs_db_embeddings.emb
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+import config
+from embedding_store import open_store
+
+
+def graph_paths(store_path):
+    """Neighbor ids, scores and meta files of the graph of a store"""
+    ids_path = config.knn_graph_path(store_path)
+    base = ids_path[:-len(".knn_ids.npy")]
+    return ids_path, base + ".knn_scores.npy", base + ".knn_meta.json"
+
+
+def store_digest(vectors, rows, block_size=65536):
+    """Hex digest of the first ``rows`` vectors of a store"""
+    digest = hashlib.blake2b(digest_size=16)
+    for start in range(0, rows, block_size):
+        digest.update(np.ascontiguousarray(vectors[start:min(start + block_size, rows)]))
+    return digest.hexdigest()
+
+
+def graph_meta(store, rows):
+    return {"rows": rows, "model_id": store.header.model_id, "dim": store.header.dim,
+            "digest": store_digest(store.vectors, rows)}
+
+
+def graph_matches(store_path, store=None):
+    """Whether the saved graph was built from the current rows of the store (False when it has no meta)"""
+    meta_path = graph_paths(store_path)[2]
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    store = store or open_store(store_path)
+    if meta.get("rows", -1) > len(store) or meta.get("model_id") != store.header.model_id \
+            or meta.get("dim") != store.header.dim:
+        return False
+    return meta.get("digest") == store_digest(store.vectors, meta["rows"])
+
+
+def top_neighbors(scores, k):
+    """Row-wise ids and scores of the ``k`` best columns of a 2-D score block, best first"""
+    k = min(k, scores.shape[1])
+    ids = np.argpartition(scores, -k, axis=1)[:, -k:] if k < scores.shape[1] else np.tile(
+        np.arange(scores.shape[1]), (len(scores), 1))
+    best = np.take_along_axis(scores, ids, axis=1)
+    order = np.argsort(-best, axis=1)
+    ids = np.take_along_axis(ids, order, axis=1)
+    best = np.take_along_axis(best, order, axis=1)
+    ids[~np.isfinite(best)] = -1
+    return ids.astype(np.int32), best.astype(np.float32)
+
+
+def pad(ids, scores, k):
+    """Right-pad neighbor lists to ``k`` columns (corpus smaller than k + 1)"""
+    missing = k - ids.shape[1]
+    if missing > 0:
+        ids = np.pad(ids, ((0, 0), (0, missing)), constant_values=-1)
+        scores = np.pad(scores, ((0, 0), (0, missing)), constant_values=-np.inf)
+    return ids, scores
+
+
+def compute_neighbors(vectors, rows, k, dead=None, block_size=1024):
+    """Neighbor lists of ``rows`` against every row of ``vectors`` (itself and ``dead`` rows excluded)"""
+    ids = np.full((len(rows), k), -1, dtype=np.int32)
+    scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        sims = vectors[block] @ vectors.T
+        sims[np.arange(len(block)), block] = -np.inf
+        if dead is not None and len(dead):
+            sims[:, dead] = -np.inf
+        block_ids, block_scores = pad(*top_neighbors(sims, k), k)
+        ids[start:start + len(block)] = block_ids
+        scores[start:start + len(block)] = block_scores
+    return ids, scores
+
+
+def merge(ids, scores, new_ids, new_scores, k):
+    """Keep the ``k`` best of two neighbor lists per row (disjoint ids)"""
+    all_ids = np.concatenate([ids, new_ids], axis=1)
+    all_scores = np.concatenate([scores, new_scores], axis=1)
+    best, best_scores = top_neighbors(all_scores, k)
+    merged = np.take_along_axis(all_ids, best.clip(0), axis=1)
+    merged[best < 0] = -1
+    return merged.astype(np.int32), best_scores
+
+
+def build_graph(vectors, k, dead=None, block_size=1024):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return compute_neighbors(vectors, np.arange(len(vectors)), k, dead=dead, block_size=block_size)
+
+
+def update_graph(ids, scores, vectors, dead=None, block_size=1024):
+    """
+    Extend a graph built over the first ``len(ids)`` rows of ``vectors`` to all of them.
+
+    Returns new (ids, scores) arrays; ``dead`` lists rows that must no
+    longer appear as neighbors.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = ids.shape[1]
+    count = len(vectors)
+    # A store rolled back by the indexer can be shorter than the graph
+    ids, scores = np.array(ids[:count]), np.array(scores[:count])
+    old = len(ids)
+    dead = np.asarray(dead if dead is not None else [], dtype=np.int64)
+
+    stale = ids >= count
+    if len(dead):
+        stale |= np.isin(ids, dead)
+    ids[stale] = -1
+    scores[stale] = -np.inf
+
+    new_rows = np.arange(old, count)
+    if len(new_rows):
+        new = vectors[new_rows]
+        for start in range(0, old, block_size):
+            stop = min(start + block_size, old)
+            sims = vectors[start:stop] @ new.T
+            if len(dead):
+                sims[:, np.isin(new_rows, dead)] = -np.inf
+            block_ids, block_scores = top_neighbors(sims, k)
+            block_ids = np.where(block_ids >= 0, block_ids + old, -1).astype(np.int32)
+            ids[start:stop], scores[start:stop] = merge(ids[start:stop], scores[start:stop],
+                                                        block_ids, block_scores, k)
+        new_ids, new_scores = compute_neighbors(vectors, new_rows, k, dead=dead, block_size=block_size)
+        ids, scores = np.concatenate([ids, new_ids]), np.concatenate([scores, new_scores])
+
+    # Rows that lost too many neighbors to deletions are recomputed
+    live = np.ones(count, dtype=bool)
+    live[dead[dead < count]] = False
+    thin = np.flatnonzero(live[:old] & ((ids[:old] >= 0).sum(axis=1) < min(k, count - 1) // 2))
+    if len(thin):
+        ids[thin], scores[thin] = compute_neighbors(vectors, thin, k, dead=dead, block_size=block_size)
+    return ids, scores
+
+
+def save_graph(store_path, ids, scores, store=None):
+    """
+    Write the graph files next to the store, renamed into place.
+
+    The ids file goes last: it is the one the reload watcher polls, and a
+    reader that sees the new meta with the old arrays rejects the graph.
+    """
+    ids_path, scores_path, meta_path = graph_paths(store_path)
+    meta = graph_meta(store or open_store(store_path), len(ids))
+    with open(f"{meta_path}.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+    for path, array in ((scores_path, scores), (ids_path, ids)):
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+
+def refresh_graph(store_path, k=None, dead=None, rebuild=False):
+    """Build the graph of a store, or update the existing one with the rows appended since; returns (ids, scores)"""
+    store = open_store(store_path)
+    ids_path, scores_path, _ = graph_paths(store_path)
+    start = time.perf_counter()
+    if not rebuild and os.path.exists(ids_path) and not graph_matches(store_path, store):
+        print(f"kNN graph of {store_path} was built from other store rows, rebuilding it")
+        rebuild = True
+        k = k or np.load(ids_path, mmap_mode="r").shape[1]
+    if rebuild or not os.path.exists(ids_path):
+        ids, scores = build_graph(store.vectors, k or config.KNN_GRAPH_K, dead=dead)
+        action = "Built"
+    else:
+        ids, scores = update_graph(np.load(ids_path), np.load(scores_path), store.vectors, dead=dead)
+        action = "Updated"
+    save_graph(store_path, ids, scores, store)
+    print(f"{action} kNN graph of {store_path}: {ids.shape[0]} rows x {ids.shape[1]} neighbors "
+          f"in {time.perf_counter() - start:.2f}s")
+    return ids, scores
+
+
+class NeighborGraph:
+    """
+    Neighbor lists of the rows of a snapshot.
+
+    ``covered`` marks the rows the graph has lists for; rows appended to the
+    store after the last update are not covered and are served by a search.
+    """
+
+    def __init__(self, ids, scores, covered):
+        self.ids = ids
+        self.scores = scores
+        self.covered = covered
+
+    @property
+    def k(self):
+        return self.ids.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.scores.nbytes
+
+    def covers(self, row):
+        return 0 <= row < len(self.covered) and bool(self.covered[row])
+
+    def neighbors(self, row, k):
+        ids = self.ids[row]
+        keep = (ids >= 0) & (ids < len(self.covered))
+        return np.asarray(ids[keep][:k], dtype=np.int64), np.asarray(self.scores[row][keep][:k])
+
+
+def load_graph(store_path, count, store_rows=None):
+    """
+    Graph of a snapshot of ``count`` rows, or None when it was never built
+    or was built from other store rows (see ``graph_matches``).
+
+    ``store_rows`` maps snapshot rows to store rows when the snapshot only
+    holds some of them (tombstoned rows of the db corpus); neighbor ids are
+    translated to snapshot rows and dropped when not in the snapshot.
+    """
+    ids_path, scores_path, _ = graph_paths(store_path)
+    if not (os.path.exists(ids_path) and os.path.exists(scores_path)):
+        return None
+    if not graph_matches(store_path):
+        print(f"Ignoring the kNN graph of {store_path}: the store was rebuilt since, run knn_graph.py build")
+        return None
+    ids = np.load(ids_path, mmap_mode="r")
+    scores = np.load(scores_path, mmap_mode="r")
+    if store_rows is None:
+        covered = np.arange(count) < len(ids)
+        return NeighborGraph(ids, scores, covered)
+
+    covered = store_rows < len(ids)
+    snapshot_row = np.full(max(len(ids), int(store_rows.max(initial=-1)) + 1), -1, dtype=np.int64)
+    snapshot_row[store_rows] = np.arange(len(store_rows))
+    source = ids[store_rows[covered]]
+    translated = np.where(source >= 0, snapshot_row[source.clip(0)], -1)
+    graph_ids = np.full((count, ids.shape[1]), -1, dtype=np.int32)
+    graph_scores = np.full((count, ids.shape[1]), -np.inf, dtype=np.float32)
+    graph_ids[covered] = translated
+    graph_scores[covered] = scores[store_rows[covered]]
+    # Keep live neighbors first, in score order
+    order = np.argsort(graph_ids < 0, axis=1, kind="stable")
+    return NeighborGraph(np.take_along_axis(graph_ids, order, axis=1),
+                         np.take_along_axis(graph_scores, order, axis=1), covered)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "update"])
+    parser.add_argument("--store", default=config.EMBEDDING_STORE_PATH)
+    parser.add_argument("--k", type=int, default=config.KNN_GRAPH_K, help="Neighbors kept per job (build)")
+    args = parser.parse_args()
+    refresh_graph(args.store, k=args.k, rebuild=args.command == "build")
+
+
+if __name__ == "__main__":
+    main()
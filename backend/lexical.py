@@ -0,0 +1,174 @@
+"""
+In-process BM25 index and hybrid (lexical + semantic) retrieval.
+
+Job titles, companies and descriptions are tokenized with a French-aware
+analyzer (accent folding, elision and stop-word removal, light plural
+stemming) into compact CSR posting lists:
+
+    terms     term -> term id
+    offsets   int64 (n_terms + 1,)  start of each term's postings
+    doc_ids   int32                 row ids, sorted within a term
+    tfs       float32               field-weighted term frequencies
+
+Exact terms the embedding model blurs (company names, "SAP", contract codes)
+are matched lexically, and the BM25 ranking is fused with the cosine ranking
+by reciprocal-rank or weighted score fusion. The lexical stage can also act
+as a cheap candidate generator so the semantic scorer only sees a few
+thousand rows.
+"""
+import re
+import unicodedata
+
+import numpy as np
+
+from vector_index import top_k
+
+# Columns indexed, with the weight applied to their term frequencies
+LEXICAL_FIELDS = {"title": 2.0, "company": 1.5, "description": 1.0}
+
+STOP_WORDS = frozenset("""
+    a au aux avec ce ces cette dans de des du en et est il elle ils je la le les leur lui ma mais me
+    meme mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi
+    ton tu un une vos votre vous c d j l m n s t y etre avoir ont sont chez plus tres
+    an and are as at be by for from in is it of on or the to with
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+|[+#]+)?")
+
+
+def fold(text):
+    """Lower-case and strip accents ("Ingénieur" -> "ingenieur")"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def stem(token):
+    """Light French/English plural stemming: "developpeurs" -> "developpeur", "bureaux" -> "bureau" """
+    if len(token) <= 4 or not token.isalpha():
+        return token
+    if token.endswith("x") or (token.endswith("s") and token[-2] not in "su"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    if not text or not isinstance(text, str):
+        return []
+    tokens = TOKEN_RE.findall(fold(text).replace("'", " ").replace("’", " "))
+    return [stem(token) for token in tokens if token not in STOP_WORDS]
+
+
+class BM25Index:
+    def __init__(self, metadata, fields=LEXICAL_FIELDS, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(metadata)
+
+        doc_terms = [dict() for _ in range(self.size)]
+        for column, weight in fields.items():
+            if column not in metadata:
+                continue
+            for row, text in enumerate(metadata.column(column).to_list()):
+                counts = doc_terms[row]
+                for token in tokenize(text):
+                    counts[token] = counts.get(token, 0.0) + weight
+
+        self.doc_lengths = np.array([sum(terms.values()) for terms in doc_terms], dtype=np.float32)
+        self.avg_length = float(self.doc_lengths.mean()) if self.size else 0.0
+
+        postings = {}
+        for row, terms in enumerate(doc_terms):
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append((row, tf))
+
+        self.terms = {term: term_id for term_id, term in enumerate(sorted(postings))}
+        counts = np.array([len(postings[term]) for term in self.terms], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.doc_ids = np.empty(self.offsets[-1], dtype=np.int32)
+        self.tfs = np.empty(self.offsets[-1], dtype=np.float32)
+        for term, term_id in self.terms.items():
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows, tfs = zip(*postings[term])
+            self.doc_ids[start:end] = rows
+            self.tfs[start:end] = tfs
+
+        # Precomputed BM25 length normalization per document
+        if self.size:
+            self.norms = (self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_length, 1e-9))).astype(np.float32)
+        else:
+            self.norms = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return self.size
+
+    def scores(self, text):
+        """Dense BM25 score array over all rows (0 for rows without any query term)"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(text)):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, tfs = self.doc_ids[start:end], self.tfs[start:end]
+            idf = np.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self.norms[docs])
+        return scores
+
+    def search(self, text, top_k_count, candidates=None):
+        """Best ``top_k_count`` rows with a positive BM25 score, as (scores, ids)"""
+        scores = self.scores(text)
+        if candidates is not None:
+            allowed = np.zeros(self.size, dtype=bool)
+            allowed[candidates] = True
+            scores[~allowed] = 0.0
+        matching = np.flatnonzero(scores > 0)
+        best = matching[top_k(scores[matching], top_k_count)]
+        return scores[best], best
+
+
+def fuse(rankings, method="rrf", weights=None, rrf_k=60):
+    """
+    Fuse several (scores, ids) rankings into one list of ids, best first.
+
+    ``rrf`` sums 1 / (rrf_k + rank) over the rankings a row appears in.
+    ``weighted`` min-max normalizes each ranking's scores and sums them with
+    ``weights`` (a missing row contributes 0).
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for (scores, ids), weight in zip(rankings, weights):
+        if method == "rrf":
+            contributions = weight / (rrf_k + np.arange(1, len(ids) + 1))
+        elif method == "weighted":
+            scores = np.asarray(scores, dtype=np.float32)
+            span = float(scores.max() - scores.min()) if len(scores) else 0.0
+            contributions = weight * ((scores - scores.min()) / span if span > 0 else np.ones_like(scores))
+        else:
+            raise ValueError(f"Unknown fusion method '{method}', expected 'rrf' or 'weighted'")
+        for row, contribution in zip(ids.tolist(), contributions.tolist()):
+            fused[row] = fused.get(row, 0.0) + contribution
+    return np.array(sorted(fused, key=fused.get, reverse=True), dtype=np.int64)
+
+
+def hybrid_search(index, lexical, text, query_vector, top_k_count, candidates=None,
+                  lexical_candidates=2000, prefilter=True, method="rrf", semantic_weight=0.5):
+    """
+    Rank rows by fusing BM25 and cosine rankings.
+
+    With ``prefilter`` the BM25 top ``lexical_candidates`` rows are the only
+    rows the semantic scorer looks at; if BM25 matches fewer than
+    ``top_k_count`` rows the semantic stage falls back to ``candidates``.
+    """
+    lex_scores, lex_ids = lexical.search(text, lexical_candidates, candidates=candidates)
+
+    if prefilter and len(lex_ids) >= top_k_count:
+        semantic_candidates, depth = np.sort(lex_ids).astype(np.int32), len(lex_ids)
+    else:
+        semantic_candidates, depth = candidates, max(top_k_count * 4, 50)
+    sem_scores, sem_ids = index.search(query_vector[None, :], depth, candidates=semantic_candidates)
+    valid = sem_ids[0] >= 0
+    semantic = (sem_scores[0][valid], sem_ids[0][valid])
+
+    fused = fuse([semantic, (lex_scores, lex_ids)], method=method,
+                 weights=[semantic_weight, 1.0 - semantic_weight])
+    return fused[:top_k_count]
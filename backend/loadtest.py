@@ -0,0 +1,318 @@
+"""
+Load test for the recommender API.
+
+Replays a query mix built from the dataset against the app, either
+in-process (httpx ASGITransport: no server, but the client shares the
+event loop and CPU with the app) or against a running server (--url), in
+two modes:
+
+  - closed loop: N concurrent clients, each sending its next request as soon
+    as the previous one completes (--concurrency 1 4 16 64)
+  - open loop: requests arrive as a Poisson process at a fixed rate whatever
+    the response times (--rates 25 50 100); latency is measured from the
+    scheduled arrival, so a saturated server shows up as growing latency
+    instead of a lower request rate
+
+Queries are job titles (some shortened to their first words, like typed
+searches), drawn with a Zipf-like popularity so repeated queries hit the
+caches as in production, with a share of facet filters and search modes.
+
+Every level reports throughput, latency percentiles and errors, the
+server's per-stage timings over that level (encode, score, gather,
+serialize: see stages.py) and its resident memory. --json writes the
+results with the git commit and the backend configuration, and --compare
+prints the changes against a previous results file.
+
+Usage (from the backend directory):
+    python loadtest.py --concurrency 1 4 16 --rates 50 100 --duration 10 --json loadtest.json
+    python loadtest.py --url http://127.0.0.1:8000 --concurrency 8 32 --rates 0
+    PROFILE_MEMORY=1 python loadtest.py --concurrency 8 --rates 0 --compare loadtest.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+import pandas as pd
+
+import config
+from stages import BUCKET_BOUNDS_MS, histogram_percentile
+
+
+class QueryMix:
+    """Random /recommend payloads drawn from the dataset's jobs"""
+
+    def __init__(self, dataset, skew=0.8, short_rate=0.5, filter_rate=0.2,
+                 modes=(("semantic", 0.8), ("hybrid", 0.15), ("lexical", 0.05)), top_ks=(5, 10)):
+        df = pd.read_csv(dataset)
+        titles = df["title"].fillna("").astype(str)
+        self.jobs = [
+            {"title": title, "location": location, "contract_type": contract_type}
+            for title, location, contract_type in zip(titles, df["location"], df["contract_type"])
+            if title.strip()
+        ]
+        # Popularity of the i-th job's query ~ 1 / (i + 1) ** skew
+        weights = 1.0 / np.arange(1, len(self.jobs) + 1) ** skew
+        self.cumulative = np.cumsum(weights / weights.sum()).tolist()
+        self.short_rate = short_rate
+        self.filter_rate = filter_rate
+        self.modes = [mode for mode, _ in modes]
+        self.mode_weights = [weight for _, weight in modes]
+        self.top_ks = top_ks
+
+    def sample(self, rng):
+        i = min(np.searchsorted(self.cumulative, rng.random()), len(self.jobs) - 1)
+        job = self.jobs[i]
+        text = job["title"]
+        # Deterministic per job, so a popular query always has the same text
+        if (i * 7919) % 100 < self.short_rate * 100:
+            text = " ".join(text.split()[:2]).lower()
+        payload = {
+            "text": text,
+            "top_k": self.top_ks[i % len(self.top_ks)],
+            "mode": rng.choices(self.modes, self.mode_weights)[0],
+        }
+        if rng.random() < self.filter_rate:
+            name = rng.choice(("location", "contract_type"))
+            if isinstance(job[name], str):
+                payload["filters"] = {name: [job[name]]}
+        return payload
+
+
+async def post(client, payload, latencies, errors, since=None):
+    start = time.perf_counter() if since is None else since
+    try:
+        response = await client.post("/recommend", json=payload)
+        ok = response.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+    if ok:
+        latencies.append((time.perf_counter() - start) * 1000)
+    else:
+        errors.append(1)
+
+
+async def closed_loop(client, mix, concurrency, duration, seed):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(rng):
+        while time.perf_counter() < deadline:
+            await post(client, mix.sample(rng), latencies, errors)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop(random.Random(seed * 1000 + i)) for i in range(concurrency)))
+    return latencies, len(errors), 0, time.perf_counter() - start
+
+
+async def open_loop(client, mix, rate, duration, seed, max_outstanding):
+    """Poisson arrivals at ``rate`` req/s; arrivals beyond ``max_outstanding`` in-flight requests are dropped"""
+    rng = random.Random(seed)
+    latencies, errors = [], []
+    pending = set()
+    dropped = 0
+    start = time.perf_counter()
+    arrival = start
+    while True:
+        arrival += rng.expovariate(rate)
+        if arrival - start >= duration:
+            break
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(pending) >= max_outstanding:
+            dropped += 1
+            continue
+        task = asyncio.create_task(post(client, mix.sample(rng), latencies, errors, since=arrival))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+    return latencies, len(errors), dropped, time.perf_counter() - start
+
+
+def stage_delta(before, after):
+    """Per-stage counters of the interval between two GET / snapshots"""
+    delta = {}
+    for name, stage in after.get("stages", {}).items():
+        previous = before.get("stages", {}).get(name, {})
+        calls = stage["calls"] - previous.get("calls", 0)
+        if not calls:
+            continue
+        histogram = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        for bucket, count in stage["histogram"].items():
+            histogram[int(bucket)] += count - previous.get("histogram", {}).get(bucket, 0)
+        total_ms = stage["total_ms"] - previous.get("total_ms", 0.0)
+        alloc_bytes = stage["alloc_bytes"] - previous.get("alloc_bytes", 0)
+        delta[name] = {
+            "calls": calls,
+            "items": stage["items"] - previous.get("items", 0),
+            "mean_ms": round(total_ms / calls, 3),
+            "p50_ms": histogram_percentile(histogram, 50),
+            "p99_ms": histogram_percentile(histogram, 99),
+            "mean_alloc_bytes": alloc_bytes // calls,
+        }
+    return delta
+
+
+def batch_size_delta(before, after):
+    batches = after.get("batches", 0) - before.get("batches", 0)
+    return round((after.get("items", 0) - before.get("items", 0)) / batches, 2) if batches else 0.0
+
+
+def summarize(mode, level, latencies, errors, dropped, seconds, before, after):
+    completed = len(latencies)
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "mode": mode,
+        "level": level,
+        "requests": completed + errors,
+        "errors": errors,
+        "dropped": dropped,
+        "seconds": round(seconds, 2),
+        "throughput": round(completed / seconds, 2) if seconds else 0.0,
+        "latency_ms": {
+            "mean": round(float(latencies.mean()), 3),
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p90": round(float(np.percentile(latencies, 90)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "max": round(float(latencies.max()), 3),
+        },
+        "stages": stage_delta(before.get("stages", {}), after.get("stages", {})),
+        "rss_bytes": after.get("stages", {}).get("rss_bytes"),
+        "mean_batch_size": batch_size_delta(before.get("batching", {}), after.get("batching", {})),
+    }
+
+
+def print_level(result):
+    latency = result["latency_ms"]
+    rss = result["rss_bytes"]
+    label = f"{result['mode']} {result['level']}" + ("" if result["mode"] == "closed" else "/s")
+    print(f"{label:<14}{result['requests']:>9}{result['errors']:>7}{result['dropped']:>8}{result['throughput']:>9.1f}"
+          f"{latency['p50']:>9.2f}{latency['p90']:>9.2f}{latency['p99']:>9.2f}{latency['max']:>9.2f}"
+          f"{rss / 1e6 if rss else 0:>9.1f}")
+    for name, stage in result["stages"].items():
+        print(f"    {name:<10} calls={stage['calls']:<7} items={stage['items']:<7} mean={stage['mean_ms']:.3f} ms  "
+              f"p50<={stage['p50_ms']:g} ms  p99<={stage['p99_ms']:g} ms  alloc={stage['mean_alloc_bytes'] / 1024:.1f} KB")
+
+
+def print_comparison(results, baseline):
+    """Throughput and latency changes against a previous --json file, level by level"""
+    previous = {(r["mode"], r["level"]): r for r in baseline["levels"]}
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '?')}):")
+    print(f"{'level':<14}{'req/s':>24}{'p50 ms':>24}{'p99 ms':>24}")
+    for result in results:
+        old = previous.get((result["mode"], result["level"]))
+        if old is None:
+            continue
+        cells = []
+        for new_value, old_value in ((result["throughput"], old["throughput"]),
+                                     (result["latency_ms"]["p50"], old["latency_ms"]["p50"]),
+                                     (result["latency_ms"]["p99"], old["latency_ms"]["p99"])):
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            cells.append(f"{old_value:.2f}->{new_value:.2f} {change:+.0f}%")
+        label = f"{result['mode']} {result['level']}"
+        print(f"{label:<14}{cells[0]:>24}{cells[1]:>24}{cells[2]:>24}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    mix = QueryMix(args.dataset, skew=args.skew, filter_rate=args.filter_rate)
+    connections = max(args.concurrency + [args.max_outstanding])
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    app = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits)
+    else:
+        import main as app  # Loads the model and the corpus
+
+        await app.start_background_tasks()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://loadtest",
+                                   timeout=args.timeout, limits=limits)
+
+    results = []
+    try:
+        server = (await client.get("/")).json()
+        print(f"Target: {args.url or 'in-process'}, {server['total_jobs']} jobs, index {server['vector_index']}")
+
+        rng = random.Random(args.seed)
+        for _ in range(args.warmup):
+            await post(client, mix.sample(rng), [], [])
+
+        print(f"\n{'level':<14}{'requests':>9}{'errors':>7}{'dropped':>8}{'req/s':>9}"
+              f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'rss MB':>9}")
+        levels = [("closed", c) for c in args.concurrency] + [("open", r) for r in args.rates if r > 0]
+        for mode, level in levels:
+            before = (await client.get("/")).json()
+            if mode == "closed":
+                outcome = await closed_loop(client, mix, level, args.duration, args.seed)
+            else:
+                outcome = await open_loop(client, mix, level, args.duration, args.seed, args.max_outstanding)
+            after = (await client.get("/")).json()
+            result = summarize(mode, level, *outcome, before, after)
+            results.append(result)
+            print_level(result)
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.stop_background_tasks()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "target": args.url or "in-process",
+        "server": {key: server.get(key) for key in ("total_jobs", "embedding_shape", "vector_index", "index_bytes")},
+        "args": vars(args),
+        "levels": results,
+    }
+    if not args.url:
+        report["server"].update(encoder_backend=config.ENCODER_BACKEND, batch_max_size=config.BATCH_MAX_SIZE,
+                                batch_max_wait_ms=config.BATCH_MAX_WAIT_MS)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Server to test (default: run the app in-process)")
+    parser.add_argument("--dataset", default=config.DATASET_PATH, help="CSV the queries are drawn from")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="Closed-loop levels: concurrent clients")
+    parser.add_argument("--rates", type=float, nargs="+", default=[25, 50, 100],
+                        help="Open-loop levels: arrivals per second (0 to skip)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per level")
+    parser.add_argument("--warmup", type=int, default=50, help="Requests sent before the first level")
+    parser.add_argument("--max-outstanding", type=int, default=1000,
+                        help="Open loop: in-flight requests beyond which arrivals are dropped")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--skew", type=float, default=0.8, help="Zipf exponent of query popularity (0: uniform)")
+    parser.add_argument("--filter-rate", type=float, default=0.2, help="Share of queries with a facet filter")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Results file of a previous run to compare with")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report["levels"], json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,76 +1,315 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import asyncio
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal
 import numpy as np
-import pickle
-import pandas as pd
+
+import config
+from batching import MicroBatcher
+from cache import LRUCache, normalize_query
+from encoders import load_encoder, warm_up
+from facets import FACETS, normalize_facet_value
+from lexical import hybrid_search
+from snapshot import SnapshotManager
+from stages import StageStats
 
 app = FastAPI()
 
+embedding_cache = LRUCache(config.EMBEDDING_CACHE_SIZE, config.EMBEDDING_CACHE_TTL)
+result_cache = LRUCache(config.RESULT_CACHE_SIZE, config.RESULT_CACHE_TTL)
+stage_stats = StageStats(trace_memory=config.PROFILE_MEMORY)
+
+
+def on_snapshot_swap(snapshot):
+    """Ranked ids of the previous corpus are meaningless for the new one"""
+    result_cache.clear()
+
+
 try:
-    model = SentenceTransformer("models/job_recommender_model")
-    
-    with open("models/job_embeddings.pkl", "rb") as f:
-        embeddings = pickle.load(f)
-    
-    df = pd.read_csv("models/keejob_ml_dataset.csv")
+    model = load_encoder()
+    print(f"Encoder: {model.name} (warm-up {warm_up(model, config.BATCH_MAX_SIZE) * 1000:.0f} ms)")
     
-    if np.isnan(embeddings).any():
-        print("Warning: Embeddings contain NaN values, cleaning...")
-        embeddings = np.nan_to_num(embeddings, nan=0.0)
+    # Corpus metadata, embeddings and vector index, swapped atomically on reload.
+    # Embeddings are sanitized and normalized when the store is built.
+    snapshots = SnapshotManager(on_swap=on_snapshot_swap)
+    snapshot = snapshots.current
     
-    if np.isinf(embeddings).any():
-        print("Warning: Embeddings contain Inf values, cleaning...")
-        embeddings = np.nan_to_num(embeddings, posinf=0.0, neginf=0.0)
-    
-    print(f"Loaded {len(df)} jobs")
-    print(f"Embeddings shape: {embeddings.shape}")
+    print(f"Loaded {len(snapshot.metadata)} jobs from {snapshot.source}")
+    print(f"Embeddings shape: {snapshot.embeddings.shape} "
+          f"({snapshot.header.dtype}, model: {snapshot.header.model_id})")
+    print(f"Vector index: {snapshot.index.name}")
     
 except Exception as e:
     print(f"Error loading models: {e}")
     raise
 
 
+# Job fields returned by /recommend
+RESULT_COLUMNS = ('title', 'company', 'sector', 'salary')
+
+
 # API INPUT SCHEMA
 class Query(BaseModel):
     text: str
-    top_k: int = 5
+    top_k: int = Field(5, ge=0)
+    # Facet name (sector, location, contract_type, source) -> accepted values
+    filters: Dict[str, List[str]] = {}
+    # "semantic" (embeddings), "lexical" (BM25) or "hybrid" (both, fused)
+    mode: Literal["semantic", "lexical", "hybrid"] = "semantic"
+    
+    def filter_key(self):
+        """Hashable, order-independent form of the filters"""
+        return tuple(sorted(
+            (name, tuple(sorted({normalize_facet_value(v) for v in values})))
+            for name, values in self.filters.items() if values
+        ))
+    
+    def cache_key(self):
+        return (normalize_query(self.text), self.top_k, self.filter_key(), self.mode)
+
+
+class BatchQuery(BaseModel):
+    queries: List[Query]
+
+
+def check_filters(query):
+    unknown = set(query.filters) - set(FACETS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown filter(s) {sorted(unknown)}, "
+                                                    f"expected some of {sorted(FACETS)}")
+
+
+def encode_queries(texts):
+    """Encode query texts, only running the model on texts missing from the embedding cache"""
+    keys = [normalize_query(text) for text in texts]
+    vectors = [embedding_cache.get(key) for key in keys]
+    
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        encoded = model.encode([texts[i] for i in missing], batch_size=config.BATCH_MAX_SIZE)
+        encoded = np.nan_to_num(encoded, nan=0.0, posinf=0.0, neginf=0.0)
+        for i, vector in zip(missing, encoded):
+            embedding_cache.put(keys[i], vector)
+            vectors[i] = vector
+    
+    return np.stack(vectors)
+
+
+def encode_and_search(queries):
+    """
+    Encode a batch of queries in one forward pass and score them with one matrix multiply.
+
+    Returns (snapshot, ranked ids) per query so results are assembled from
+    the same snapshot they were ranked on.
+    """
+    snapshot = snapshots.current
+    
+    semantic = [i for i, q in enumerate(queries) if q.mode != "lexical"]
+    q_embed = None
+    if semantic:
+        with stage_stats.measure("encode", len(semantic)):
+            q_embed = encode_queries([queries[i].text for i in semantic])
+    vector_of = {i: row for row, i in enumerate(semantic)}
+    
+    candidates_of = {}
+    def candidates(q):
+        key = q.filter_key()
+        if key not in candidates_of:
+            candidates_of[key] = snapshot.facets.candidates({name: values for name, values in key})
+        return candidates_of[key]
+    
+    results = [None] * len(queries)
+    
+    with stage_stats.measure("score", len(queries)):
+        # Semantic queries sharing the same filters are scored together over the same candidate rows
+        groups = {}
+        for i, q in enumerate(queries):
+            if q.mode == "semantic":
+                groups.setdefault(q.filter_key(), []).append(i)
+        for filter_key, members in groups.items():
+            top_k = max(queries[i].top_k for i in members)
+            rows = [vector_of[i] for i in members]
+            scores, ids = snapshot.index.search(q_embed[rows], top_k, candidates=candidates(queries[members[0]]))
+            for i, row in zip(members, ids):
+                row = row[:queries[i].top_k]
+                results[i] = (snapshot, row[row >= 0])
+    
+        for i, q in enumerate(queries):
+            if q.mode == "lexical":
+                scores, ids = snapshot.lexical.search(q.text, q.top_k, candidates=candidates(q))
+                results[i] = (snapshot, ids)
+            elif q.mode == "hybrid":
+                ids = hybrid_search(
+                    snapshot.index, snapshot.lexical, q.text, q_embed[vector_of[i]], q.top_k,
+                    candidates=candidates(q),
+                    lexical_candidates=config.HYBRID_LEXICAL_CANDIDATES,
+                    prefilter=config.HYBRID_PREFILTER,
+                    method=config.HYBRID_FUSION,
+                    semantic_weight=config.HYBRID_SEMANTIC_WEIGHT,
+                )
+                results[i] = (snapshot, ids)
+    
+    return results
+
+
+batcher = MicroBatcher(
+    encode_and_search,
+    max_batch_size=config.BATCH_MAX_SIZE,
+    max_wait_ms=config.BATCH_MAX_WAIT_MS,
+)
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    batcher.start()
+    snapshots.start_watcher(config.corpus_paths(), config.RELOAD_WATCH_INTERVAL)
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await batcher.stop()
+    snapshots.stop_watcher()
+
 
 @app.get("/")
 def root():
     """Health check endpoint"""
+    snapshot = snapshots.current
     return {
         "status": "online",
         "message": "Job Recommender API",
-        "total_jobs": len(df),
-        "embedding_shape": list(embeddings.shape)
+        "total_jobs": len(snapshot.metadata),
+        "embedding_shape": list(snapshot.embeddings.shape),
+        "metadata_bytes": snapshot.metadata.nbytes(),
+        "vector_index": snapshot.index.name,
+        "index_bytes": snapshot.index.nbytes,
+        "knn_graph": {"k": snapshot.graph.k, "rows": int(snapshot.graph.covered.sum()),
+                      "bytes": snapshot.graph.nbytes} if snapshot.graph is not None else None,
+        "snapshot": snapshots.status(),
+        "batching": batcher.metrics(),
+        "stages": stage_stats.as_dict(),
+        "cache": {
+            "embeddings": embedding_cache.stats(),
+            "results": result_cache.stats()
+        }
     }
 
 # RECOMMENDATION ENDPOINT
 @app.post("/recommend")
-def recommend(query: Query):
+async def recommend(query: Query):
+    check_filters(query)
     try:
-        q_embed = model.encode([query.text])
-        
-        q_embed = np.nan_to_num(q_embed, nan=0.0, posinf=0.0, neginf=0.0)
-        
-        scores = cosine_similarity(q_embed, embeddings)[0]
-        
-        scores = np.nan_to_num(scores, nan=0.0, posinf=0.0, neginf=0.0)
+        snapshot = snapshots.current
+        cache_key = query.cache_key()
+        top_idx = result_cache.get((snapshot.version, *cache_key))
+        if top_idx is None:
+            snapshot, top_idx = await batcher.submit(query)
+            result_cache.put((snapshot.version, *cache_key), top_idx)
         
-        top_idx = np.argsort(scores)[::-1][:query.top_k]
+        # Nulls are already normalized to None in the metadata store
+        with stage_stats.measure("gather"):
+            results = snapshot.metadata.gather(top_idx, RESULT_COLUMNS)
+        with stage_stats.measure("serialize"):
+            return JSONResponse(results)
         
-        results = df.iloc[top_idx][['title', 'company', 'sector', 'salary']].copy()
-        
-        results_dict = results.to_dict(orient="records")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Recommendation error: {str(e)}")
+
+
+@app.post("/recommend/batch")
+async def recommend_batch(batch: BatchQuery):
+    """
+    Rank jobs for many queries at once (e.g. partner profiles).
+
+    Queries missing from the result cache are encoded in one forward pass
+    and scored with one matrix multiply per filter combination, outside the
+    micro-batcher so a large batch is not split into BATCH_MAX_SIZE chunks.
+    Returns one result list per query, in order.
+    """
+    if len(batch.queries) > config.RECOMMEND_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {config.RECOMMEND_BATCH_MAX_QUERIES} "
+                                                    f"queries per batch, got {len(batch.queries)}")
+    for query in batch.queries:
+        check_filters(query)
+    try:
+        snapshot = snapshots.current
+        keys = [query.cache_key() for query in batch.queries]
+        ranked = []
+        for key in keys:
+            top_idx = result_cache.get((snapshot.version, *key))
+            ranked.append((snapshot, top_idx) if top_idx is not None else None)
         
-        for record in results_dict:
-            for key, value in record.items():
-                if pd.isna(value) or (isinstance(value, float) and not np.isfinite(value)):
-                    record[key] = None  
+        missing = [i for i, result in enumerate(ranked) if result is None]
+        if missing:
+            loop = asyncio.get_running_loop()
+            searched = await loop.run_in_executor(None, encode_and_search, [batch.queries[i] for i in missing])
+            for i, (result_snapshot, top_idx) in zip(missing, searched):
+                result_cache.put((result_snapshot.version, *keys[i]), top_idx)
+                ranked[i] = (result_snapshot, top_idx)
         
-        return results_dict
+        with stage_stats.measure("gather", len(ranked)):
+            results = [result_snapshot.metadata.gather(top_idx, RESULT_COLUMNS)
+                       for result_snapshot, top_idx in ranked]
+        with stage_stats.measure("serialize", len(ranked)):
+            return JSONResponse(results)
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Recommendation error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Recommendation error: {str(e)}")
+
+
+@app.get("/jobs/{job_id}/similar")
+def similar_jobs(job_id: int, top_k: int = 5):
+    """
+    Jobs most similar to a job (its jobs.db id, or its dataset row for the csv corpus).
+
+    Served from the precomputed kNN graph; jobs the graph does not cover yet
+    (added since its last update) and top_k above the graph's k fall back to
+    a vector index search with the job's own embedding.
+    """
+    snapshot = snapshots.current
+    row = snapshot.row_of(job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    top_k = max(0, top_k)
+    
+    graph = snapshot.graph
+    if graph is not None and graph.covers(row) and top_k <= graph.k:
+        ids, scores = graph.neighbors(row, top_k)
+    else:
+        # One extra result for the job itself
+        scores, ids = snapshot.index.search(np.asarray(snapshot.embeddings[row:row + 1]), top_k + 1)
+        keep = (ids[0] >= 0) & (ids[0] != row)
+        ids, scores = ids[0][keep][:top_k], scores[0][keep][:top_k]
+    
+    records = snapshot.metadata.gather(ids, RESULT_COLUMNS)
+    for record, neighbor, score in zip(records, ids.tolist(), scores.tolist()):
+        record["id"] = snapshot.job_id(neighbor)
+        record["score"] = round(score, 4)
+    return records
+
+
+@app.get("/facets")
+def facets():
+    """Available filter values with their job counts"""
+    snapshot = snapshots.current
+    return {name: snapshot.facets.value_counts(name) for name in FACETS}
+
+
+# ADMIN ENDPOINTS
+@app.post("/admin/reload", status_code=202)
+def admin_reload(wait: bool = False, x_admin_token: str = Header(default="")):
+    """Rebuild the corpus snapshot off the request path and swap it in"""
+    if config.ADMIN_TOKEN and x_admin_token != config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    
+    if wait:
+        try:
+            snapshots.reload()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Reload error: {str(e)}")
+        return snapshots.status()
+    
+    started = snapshots.reload_in_background()
+    return {"started": started, **snapshots.status()}
@@ -0,0 +1,68 @@
+"""
+Read-only columnar job metadata.
+
+Each column is stored as an int32 code array indexed by row id plus a list of
+distinct values (strings are interned), with nulls (NaN, None, +/-Inf)
+normalized to code -1 once at build time. Assembling a response is then an
+O(top_k) gather of Python objects, without building a DataFrame or checking
+values with pd.isna per request, and repeated values (companies, sectors,
+locations) are held once instead of once per row.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+class Column:
+    def __init__(self, series):
+        if pd.api.types.is_float_dtype(series):
+            series = series.where(np.isfinite(series))
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        self.codes = codes.astype(np.int32)
+        self.values = [self._to_python(value) for value in uniques]
+
+    @staticmethod
+    def _to_python(value):
+        if isinstance(value, str):
+            return sys.intern(value)
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    def __getitem__(self, row):
+        code = self.codes[row]
+        return self.values[code] if code >= 0 else None
+
+    def to_list(self):
+        values = self.values + [None]  # code -1 -> None
+        return [values[code] for code in self.codes.tolist()]
+
+    def nbytes(self):
+        return self.codes.nbytes + sum(sys.getsizeof(value) for value in self.values)
+
+
+class MetadataStore:
+    def __init__(self, df):
+        self.size = len(df)
+        self.columns = {name: Column(df[name]) for name in df.columns}
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def column(self, name):
+        return self.columns[name]
+
+    def gather(self, rows, names):
+        """Records for ``rows`` restricted to the columns ``names`` (missing columns are None)"""
+        columns = [(name, self.columns.get(name)) for name in names]
+        return [
+            {name: column[row] if column is not None else None for name, column in columns}
+            for row in np.asarray(rows).tolist()
+        ]
+
+    def nbytes(self):
+        return sum(column.nbytes() for column in self.columns.values())
@@ -0,0 +1,172 @@
+"""
+Atomic corpus snapshots for hot reloading.
+
+A Snapshot bundles everything a request needs to rank jobs: the columnar
+metadata, the embeddings, the vector index built over them, the facet
+indexes, the BM25 index and the kNN graph of similar jobs. The
+SnapshotManager builds a new snapshot off the request path (in a
+background thread) and then replaces a single reference. Requests read
+``manager.current`` once and keep using that object, so in-flight
+requests finish on the snapshot they started with while new requests see
+the new one.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from corpus import load_corpus
+from embedding_store import StoreHeader
+from facets import FacetIndex
+from knn_graph import load_graph
+from lexical import BM25Index
+from metadata_store import MetadataStore
+from vector_index import build_index
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    metadata: MetadataStore
+    embeddings: np.ndarray
+    index: object
+    facets: FacetIndex
+    lexical: BM25Index
+    header: StoreHeader
+    source: str
+    loaded_at: float = field(default_factory=time.time)
+    # NeighborGraph, or None when the graph of the store was never built
+    graph: object = None
+    # jobs.db id of every row and their sort order (db corpus); None when job ids are row numbers
+    job_ids: np.ndarray = None
+    job_id_order: np.ndarray = None
+
+    def job_id(self, row):
+        return row if self.job_ids is None else int(self.job_ids[row])
+
+    def row_of(self, job_id):
+        """Row of a job id, or None when the job is not in this snapshot"""
+        if self.job_ids is None:
+            return job_id if 0 <= job_id < len(self.metadata) else None
+        i = np.searchsorted(self.job_ids, job_id, sorter=self.job_id_order)
+        if i < len(self.job_ids) and self.job_ids[self.job_id_order[i]] == job_id:
+            return int(self.job_id_order[i])
+        return None
+
+
+def build_snapshot(version):
+    """Load the configured corpus and build its vector, facet and BM25 indexes"""
+    corpus = load_corpus()
+    # The DataFrame is only used to build the columnar store and is dropped afterwards
+    metadata = MetadataStore(corpus.df)
+    index = build_index(corpus.embeddings, normalized=True)
+    facets = FacetIndex(metadata)
+    lexical = BM25Index(metadata)
+    graph = load_graph(corpus.store_path, len(metadata), corpus.store_rows)
+    job_ids = job_id_order = None
+    if "id" in metadata:
+        job_ids = np.asarray(metadata.column("id").to_list(), dtype=np.int64)
+        job_id_order = np.argsort(job_ids, kind="stable")
+    return Snapshot(version=version, metadata=metadata, embeddings=corpus.embeddings, index=index,
+                    facets=facets, lexical=lexical, header=corpus.header, source=corpus.source,
+                    graph=graph, job_ids=job_ids, job_id_order=job_id_order)
+
+
+class SnapshotManager:
+    """
+    Owns the current snapshot and reloads it on demand.
+
+    ``on_swap`` is called with the new snapshot right after it becomes
+    current (used to invalidate the result cache).
+    """
+
+    def __init__(self, builder=build_snapshot, on_swap=None):
+        self.builder = builder
+        self.on_swap = on_swap
+        self.reload_lock = threading.Lock()
+        self.reload_thread = None
+        self.watch_thread = None
+        self.watch_stop = threading.Event()
+        self.reloads = 0
+        self.last_error = None
+        self.last_duration = None
+        self.current = self.builder(1)
+
+    @property
+    def reloading(self):
+        return self.reload_lock.locked()
+
+    def reload(self):
+        """Build a new snapshot and swap it in; concurrent calls are serialized"""
+        with self.reload_lock:
+            start = time.perf_counter()
+            try:
+                snapshot = self.builder(self.current.version + 1)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Reload failed, keeping snapshot v{self.current.version}: {self.last_error}")
+                raise
+            self.current = snapshot
+            self.reloads += 1
+            self.last_error = None
+            self.last_duration = time.perf_counter() - start
+            if self.on_swap is not None:
+                self.on_swap(snapshot)
+            print(f"Swapped in snapshot v{snapshot.version}: {len(snapshot.metadata)} jobs "
+                  f"in {self.last_duration:.2f}s")
+            return snapshot
+
+    def reload_in_background(self):
+        """Start a reload thread; returns False if a reload is already running"""
+        if self.reloading or (self.reload_thread is not None and self.reload_thread.is_alive()):
+            return False
+        self.reload_thread = threading.Thread(target=self._reload_quietly, name="snapshot-reload", daemon=True)
+        self.reload_thread.start()
+        return True
+
+    def _reload_quietly(self):
+        try:
+            self.reload()
+        except Exception:
+            pass  # already logged and kept in last_error
+
+    def start_watcher(self, paths, interval):
+        """Reload whenever the modification time of one of ``paths`` changes"""
+        if interval <= 0 or self.watch_thread is not None:
+            return
+        self.watch_stop.clear()
+        self.watch_thread = threading.Thread(target=self._watch, args=(list(paths), interval),
+                                             name="snapshot-watcher", daemon=True)
+        self.watch_thread.start()
+
+    def stop_watcher(self):
+        self.watch_stop.set()
+        if self.watch_thread is not None:
+            self.watch_thread.join()
+            self.watch_thread = None
+
+    @staticmethod
+    def _mtimes(paths):
+        return {path: os.path.getmtime(path) if os.path.exists(path) else None for path in paths}
+
+    def _watch(self, paths, interval):
+        seen = self._mtimes(paths)
+        while not self.watch_stop.wait(interval):
+            current = self._mtimes(paths)
+            if current != seen:
+                seen = current
+                self._reload_quietly()
+
+    def status(self):
+        snapshot = self.current
+        return {
+            "version": snapshot.version,
+            "source": snapshot.source,
+            "loaded_at": snapshot.loaded_at,
+            "reloads": self.reloads,
+            "reloading": self.reloading,
+            "last_reload_seconds": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,119 @@
+"""
+Per-stage timing of the recommendation path.
+
+/recommend is split into four stages, each recorded with
+``StageStats.measure``:
+
+  - encode:    query embeddings (cache lookups + model forward pass), per batch
+  - score:     vector / lexical / hybrid search, top-k selection included, per batch
+  - gather:    metadata rows of the ranked ids, per request
+  - serialize: JSON encoding of the response, per request
+
+Durations go into fixed log-spaced histogram buckets, so two snapshots of
+the counters (e.g. GET / before and after a load-test level) can be
+subtracted to get the percentiles of that interval alone. With
+PROFILE_MEMORY=1, tracemalloc also records the peak Python allocation of
+each stage call (approximate when stages run concurrently in different
+threads, and it slows everything down: use it for memory runs only).
+"""
+import bisect
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets in ms: 20 per decade from 1 µs to 100 s
+BUCKET_BOUNDS_MS = tuple(float(f"{10 ** (e / 20):.3g}") for e in range(-60, 101))
+
+
+def histogram_percentile(counts, q):
+    """Upper bound (ms) of the bucket holding the q-th percentile of ``counts``"""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q / 100 * total
+    seen = 0
+    for bound, count in zip(BUCKET_BOUNDS_MS + (BUCKET_BOUNDS_MS[-1],), counts):
+        seen += count
+        if seen >= rank and count:
+            return bound
+    return BUCKET_BOUNDS_MS[-1]
+
+
+def rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource  # Unix only
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Stage:
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.alloc_bytes = 0
+        self.max_alloc_bytes = 0
+        self.histogram = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    def record(self, seconds, items, alloc_bytes):
+        self.calls += 1
+        self.items += items
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.alloc_bytes += alloc_bytes
+        self.max_alloc_bytes = max(self.max_alloc_bytes, alloc_bytes)
+        self.histogram[bisect.bisect_left(BUCKET_BOUNDS_MS, seconds * 1000)] += 1
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "items": self.items,
+            "total_ms": round(self.seconds * 1000, 3),
+            "mean_ms": round(self.seconds * 1000 / self.calls, 3) if self.calls else 0.0,
+            "p50_ms": histogram_percentile(self.histogram, 50),
+            "p99_ms": histogram_percentile(self.histogram, 99),
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "alloc_bytes": self.alloc_bytes,
+            "mean_alloc_bytes": self.alloc_bytes // self.calls if self.calls else 0,
+            "max_alloc_bytes": self.max_alloc_bytes,
+            # Sparse: bucket index -> count
+            "histogram": {str(i): count for i, count in enumerate(self.histogram) if count},
+        }
+
+
+class StageStats:
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    @contextmanager
+    def measure(self, name, items=1):
+        if self.trace_memory:
+            start_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            alloc_bytes = max(0, tracemalloc.get_traced_memory()[1] - start_bytes) if self.trace_memory else 0
+            with self.lock:
+                self.stages.setdefault(name, Stage()).record(seconds, items, alloc_bytes)
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+    def as_dict(self):
+        with self.lock:
+            stages = {name: stage.as_dict() for name, stage in self.stages.items()}
+        return {"memory_traced": self.trace_memory, "rss_bytes": rss_bytes(), "stages": stages}
@@ -0,0 +1,364 @@
+"""
+Vector indexes for the job recommender.
+
+Every index stores L2-normalized vectors (float32, or float16 when served from
+a float16 embedding store), so the inner product of a normalized query with a
+stored vector is their cosine similarity. All indexes expose the same
+interface:
+
+    scores, ids = index.search(queries, top_k, candidates=None)
+
+where ``queries`` is an (n, dim) array and both results are (n, top_k) arrays
+sorted by decreasing score. ``candidates`` optionally restricts the search to
+a sorted array of row ids (e.g. the rows matching a facet filter); only those
+rows are scored. Slots that could not be filled hold id -1.
+
+Pass ``normalized=True`` for vectors that are already L2-normalized (e.g. a
+memory-mapped embedding store) so the index uses them without copying.
+
+``nbytes`` is the size of the arrays every unfiltered query scans and
+``bytes_per_job`` the part of it that grows with the corpus (codebooks and
+centroids are a fixed cost).
+"""
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+import config
+
+
+def normalize(vectors):
+    """Return a float32, L2-normalized copy of ``vectors`` (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    vectors = np.nan_to_num(vectors, nan=0.0, posinf=0.0, neginf=0.0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores, k):
+    """
+    Indices of the ``k`` highest scores in a 1-D array, best first.
+
+    Uses argpartition (O(n)) and only sorts the k selected entries.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        idx = np.argpartition(scores, -k)[-k:]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(scores[idx])[::-1]]
+
+
+def search_subset(vectors, queries, top_k_count, candidates):
+    """Exact search over the rows listed in ``candidates`` only (queries already normalized)"""
+    k = min(top_k_count, len(vectors))
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    ids = np.full((len(queries), k), -1, dtype=np.int64)
+    if len(candidates) and k:
+        candidate_scores = queries @ vectors[candidates].T
+        for row, row_scores in enumerate(candidate_scores):
+            best = top_k(row_scores, k)
+            scores[row, :len(best)] = row_scores[best]
+            ids[row, :len(best)] = candidates[best]
+    return scores, ids
+
+
+class FlatIndex:
+    """Exact search: one matrix-vector product over the whole corpus"""
+
+    name = "flat"
+
+    def __init__(self, vectors, normalized=False):
+        self.vectors = vectors if normalized else normalize(vectors)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def nbytes(self):
+        return self.vectors.nbytes
+
+    @property
+    def bytes_per_job(self):
+        return self.vectors.itemsize * self.vectors.shape[1]
+
+    def search(self, queries, top_k_count, candidates=None):
+        queries = normalize(queries)
+        if candidates is None:
+            all_scores = queries @ self.vectors.T
+            ids = np.stack([top_k(row, top_k_count) for row in all_scores])
+            return np.take_along_axis(all_scores, ids, axis=1), ids
+        return search_subset(self.vectors, queries, top_k_count, candidates)
+
+
+class IVFIndex:
+    """
+    Approximate search with an inverted file index.
+
+    The corpus is clustered with spherical k-means. At query time only the
+    ``nprobe`` clusters whose centroids are closest to the query are scanned,
+    so the cost is roughly ``nprobe / nlist`` of a flat scan.
+    """
+
+    name = "ivf"
+
+    def __init__(self, vectors, nlist=0, nprobe=8, n_iter=20, seed=0, normalized=False):
+        self.vectors = vectors if normalized else normalize(vectors)
+        n = len(self.vectors)
+        self.nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+        self.nprobe = max(1, nprobe)
+
+        self.centroids = self._train(self.vectors, self.nlist, n_iter, seed)
+        assignments = np.argmax(self.vectors @ self.centroids.T, axis=1)
+
+        # Inverted lists stored as one permutation plus offsets (CSR layout)
+        self.order = np.argsort(assignments, kind="stable").astype(np.int64)
+        counts = np.bincount(assignments, minlength=self.nlist)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def nbytes(self):
+        return self.vectors.nbytes + self.centroids.nbytes + self.order.nbytes + self.offsets.nbytes
+
+    @property
+    def bytes_per_job(self):
+        return self.vectors.itemsize * self.vectors.shape[1] + self.order.itemsize
+
+    @staticmethod
+    def _train(vectors, nlist, n_iter, seed):
+        """Spherical k-means on (a sample of) the corpus"""
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), nlist * 256)
+        sample = normalize(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+
+            # Re-seed empty clusters with random points
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+
+            centroids = normalize(sums)
+        return centroids
+
+    def list_ids(self, list_no):
+        return self.order[self.offsets[list_no]:self.offsets[list_no + 1]]
+
+    def search(self, queries, top_k_count, candidates=None, nprobe=None):
+        queries = normalize(queries)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+
+        # A selective filter is cheaper to scan exactly than to probe
+        if candidates is not None and len(candidates) <= len(self.vectors) * nprobe / self.nlist:
+            return search_subset(self.vectors, queries, top_k_count, candidates)
+        allowed = None
+        if candidates is not None:
+            allowed = np.zeros(len(self.vectors), dtype=bool)
+            allowed[candidates] = True
+
+        probes = np.argsort(queries @ self.centroids.T, axis=1)[:, ::-1][:, :nprobe]
+
+        k = min(top_k_count, len(self.vectors))
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, (query, lists) in enumerate(zip(queries, probes)):
+            probed = np.concatenate([self.list_ids(l) for l in lists])
+            if allowed is not None:
+                probed = probed[allowed[probed]]
+            candidate_scores = self.vectors[probed] @ query
+            best = top_k(candidate_scores, k)
+            scores[row, :len(best)] = candidate_scores[best]
+            ids[row, :len(best)] = probed[best]
+        return scores, ids
+
+
+class QuantizedIndex(ABC):
+    """
+    Base class of the compressed indexes.
+
+    Every query is scored against compact codes held in memory (asymmetric
+    distance: the query stays in float32, only the corpus is compressed).
+    The ``rerank`` best rows are then re-scored exactly with the float
+    vectors, which are only read for those rows: with a memory-mapped
+    embedding store they stay in the (shared) page cache instead of each
+    worker's memory.
+    """
+
+    chunk_rows = 8192  # Rows decoded at once, bounds the temporary float buffers
+
+    def __init__(self, vectors, rerank=200, normalized=False):
+        self.vectors = vectors if normalized else normalize(vectors)
+        self.rerank = rerank
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @abstractmethod
+    def approximate_scores(self, query, rows=None):
+        """Scores of one query against the codes of ``rows`` (all rows when None)"""
+
+    def search(self, queries, top_k_count, candidates=None):
+        queries = normalize(queries)
+        k = min(top_k_count, len(self.vectors))
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        if candidates is not None and not len(candidates):
+            return scores, ids
+        for row, query in enumerate(queries):
+            approx = self.approximate_scores(query, candidates)
+            shortlist = top_k(approx, max(k, self.rerank))
+            if candidates is not None:
+                shortlist = candidates[shortlist]
+            shortlist = np.sort(shortlist)  # Sequential reads from the store
+            exact = self.vectors[shortlist] @ query
+            best = top_k(exact, k)
+            scores[row, :len(best)] = exact[best]
+            ids[row, :len(best)] = shortlist[best]
+        return scores, ids
+
+
+class SQ8Index(QuantizedIndex):
+    """
+    int8 scalar quantization: each dimension is scaled by its largest
+    absolute value and rounded to [-127, 127] (1 byte per dimension, 4x
+    smaller than float32).
+    """
+
+    name = "sq8"
+
+    def __init__(self, vectors, rerank=200, normalized=False):
+        super().__init__(vectors, rerank=rerank, normalized=normalized)
+        scale = np.abs(self.vectors).max(axis=0).astype(np.float32) / 127
+        scale[scale == 0] = 1.0
+        self.scale = scale
+        self.codes = np.empty(self.vectors.shape, dtype=np.int8)
+        for start in range(0, len(self.vectors), self.chunk_rows):
+            chunk = self.vectors[start:start + self.chunk_rows] / scale
+            self.codes[start:start + self.chunk_rows] = np.clip(np.rint(chunk), -127, 127)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scale.nbytes
+
+    @property
+    def bytes_per_job(self):
+        return self.codes.shape[1]
+
+    def approximate_scores(self, query, rows=None):
+        codes = self.codes if rows is None else self.codes[rows]
+        scaled_query = query * self.scale
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.chunk_rows):
+            scores[start:start + self.chunk_rows] = codes[start:start + self.chunk_rows].astype(np.float32) @ scaled_query
+        return scores
+
+
+class PQIndex(QuantizedIndex):
+    """
+    Product quantization: vectors are split into ``m`` sub-vectors, each
+    replaced by the id of its nearest centroid among 256 learned for that
+    sub-space (``m`` bytes per vector, e.g. 48 bytes instead of 1536 for
+    384 float32 dimensions). A query is scored by summing, per sub-space,
+    the inner product of its sub-vector with the code's centroid, read from
+    a lookup table computed once per query.
+    """
+
+    name = "pq"
+
+    def __init__(self, vectors, m=48, rerank=200, n_iter=20, seed=0, normalized=False):
+        super().__init__(vectors, rerank=rerank, normalized=normalized)
+        n, dim = self.vectors.shape
+        if dim % m:
+            raise ValueError(f"PQ needs m to divide the dimension ({dim} % {m} != 0)")
+        self.m = m
+        self.dsub = dim // m
+        self.ksub = min(256, n)
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, self.ksub * 64)
+        sample = np.asarray(self.vectors[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+        self.codebooks = np.stack([
+            self._train(sample[:, j * self.dsub:(j + 1) * self.dsub], self.ksub, n_iter, rng)
+            for j in range(m)
+        ])
+
+        self.codes = np.empty((n, m), dtype=np.uint8)
+        for start in range(0, n, self.chunk_rows):
+            chunk = np.asarray(self.vectors[start:start + self.chunk_rows], dtype=np.float32)
+            for j in range(m):
+                self.codes[start:start + len(chunk), j] = self._assign(
+                    chunk[:, j * self.dsub:(j + 1) * self.dsub], self.codebooks[j]
+                )
+        self.subspaces = np.arange(m)
+
+    @staticmethod
+    def _assign(points, centroids):
+        # argmin ||x - c||^2 = argmax (x.c - ||c||^2 / 2)
+        return np.argmax(points @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+
+    @classmethod
+    def _train(cls, points, k, n_iter, rng):
+        """Euclidean k-means on one sub-space"""
+        centroids = points[rng.choice(len(points), k, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = cls._assign(points, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, points)
+            counts = np.bincount(assignments, minlength=k)
+            empty = counts == 0
+            centroids = sums / np.maximum(counts, 1)[:, None]
+            if empty.any():
+                centroids[empty] = points[rng.choice(len(points), int(empty.sum()))]
+        return centroids.astype(np.float32)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.codebooks.nbytes
+
+    @property
+    def bytes_per_job(self):
+        return self.m
+
+    def approximate_scores(self, query, rows=None):
+        codes = self.codes if rows is None else self.codes[rows]
+        # (m, 256) inner products of the query sub-vectors with every centroid
+        table = np.einsum("jd,jkd->jk", query.reshape(self.m, self.dsub), self.codebooks)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.chunk_rows):
+            scores[start:start + self.chunk_rows] = table[self.subspaces, codes[start:start + self.chunk_rows]].sum(axis=1)
+        return scores
+
+
+INDEX_BACKENDS = {
+    FlatIndex.name: FlatIndex,
+    IVFIndex.name: IVFIndex,
+    SQ8Index.name: SQ8Index,
+    PQIndex.name: PQIndex,
+}
+
+
+def build_index(vectors, backend=None, normalized=False):
+    """Build the index selected by ``backend`` (defaults to config.VECTOR_INDEX_BACKEND)"""
+    backend = backend or config.VECTOR_INDEX_BACKEND
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown vector index backend '{backend}', expected one of {sorted(INDEX_BACKENDS)}")
+    if backend == IVFIndex.name:
+        return IVFIndex(vectors, nlist=config.IVF_NLIST, nprobe=config.IVF_NPROBE, normalized=normalized)
+    if backend == SQ8Index.name:
+        return SQ8Index(vectors, rerank=config.QUANT_RERANK, normalized=normalized)
+    if backend == PQIndex.name:
+        return PQIndex(vectors, m=config.PQ_M, rerank=config.QUANT_RERANK, normalized=normalized)
+    return INDEX_BACKENDS[backend](vectors, normalized=normalized)
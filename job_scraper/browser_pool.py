@@ -0,0 +1,189 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+def create_chrome_driver(page_load_timeout=30, script_timeout=15):
+    """Start a headless Chrome configured to get past Cloudflare's basic checks"""
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')  # Run in background
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+    chrome_options.add_argument(f'user-agent={USER_AGENT}')
+    
+    driver = webdriver.Chrome(
+        service=Service(chromedriver_path()),
+        options=chrome_options
+    )
+    
+    # Override webdriver detection
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    
+    # A page or script that hangs raises TimeoutException instead of blocking the worker
+    driver.set_page_load_timeout(page_load_timeout)
+    driver.set_script_timeout(script_timeout)
+    return driver
+
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+
+def chromedriver_path():
+    """Resolve (and download if needed) chromedriver once per process"""
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path is None:
+            _chromedriver_path = ChromeDriverManager().install()
+        return _chromedriver_path
+
+
+class BrowserPool:
+    """
+    Pool of reusable WebDriver instances shared by every spider in the process.
+    
+    Drivers are started lazily up to ``size`` and handed out with
+    checkout()/checkin() (or the ``driver()`` context manager). A driver is
+    health-checked before it is handed out and recycled when it fails the
+    check, raises a WebDriver error or timeout while in use, or has served
+    ``max_uses`` pages (Chrome slowly leaks memory).
+    """
+    
+    def __init__(self, size=3, driver_factory=create_chrome_driver, max_uses=50, checkout_timeout=120):
+        self.size = size
+        self.driver_factory = driver_factory
+        self.max_uses = max_uses
+        self.checkout_timeout = checkout_timeout
+        self.idle = queue.LifoQueue()
+        self.uses = {}
+        self.created = 0
+        self.lock = threading.Lock()
+        self.closed = False
+        self.stats = {'started': 0, 'recycled': 0, 'checkouts': 0, 'startup_seconds': 0.0}
+    
+    def checkout(self):
+        """Return a healthy driver, starting a new one if the pool is not full yet"""
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            if self.closed:
+                raise RuntimeError("Browser pool is closed")
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                driver = self._start_if_room()
+                if driver is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No browser available after {self.checkout_timeout}s")
+                    try:
+                        driver = self.idle.get(timeout=min(remaining, 1.0))
+                    except queue.Empty:
+                        continue
+            
+            if self.is_healthy(driver):
+                self.stats['checkouts'] += 1
+                return driver
+            self.recycle(driver)
+    
+    def checkin(self, driver, healthy=True):
+        """Give a driver back; unhealthy or worn-out drivers are quit instead"""
+        self.uses[id(driver)] = self.uses.get(id(driver), 0) + 1
+        if not healthy or self.closed or self.uses[id(driver)] >= self.max_uses:
+            self.recycle(driver)
+        else:
+            self.idle.put(driver)
+    
+    @contextmanager
+    def driver(self):
+        driver = self.checkout()
+        try:
+            yield driver
+        except (TimeoutException, WebDriverException):
+            self.checkin(driver, healthy=False)
+            raise
+        except BaseException:
+            self.checkin(driver)
+            raise
+        else:
+            self.checkin(driver)
+    
+    def _start_if_room(self):
+        with self.lock:
+            if self.created >= self.size:
+                return None
+            self.created += 1
+        start = time.monotonic()
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+        self.stats['started'] += 1
+        self.stats['startup_seconds'] += time.monotonic() - start
+        logger.info(f"✅ Started browser {self.created}/{self.size} in {time.monotonic() - start:.1f}s")
+        return driver
+    
+    @staticmethod
+    def is_healthy(driver):
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+    
+    def recycle(self, driver):
+        """Quit a driver and free its slot so a fresh one can be started"""
+        self.uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self.lock:
+            self.created -= 1
+        self.stats['recycled'] += 1
+    
+    def close(self):
+        """Quit every idle driver; drivers still checked out are quit on checkin"""
+        self.closed = True
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.recycle(driver)
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_browser_pool(settings):
+    """Process-wide pool, so browsers are started once per worker rather than once per spider"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None or _shared_pool.closed:
+            page_load_timeout = settings.getint('SELENIUM_PAGE_LOAD_TIMEOUT', 30)
+            script_timeout = settings.getint('SELENIUM_SCRIPT_TIMEOUT', 15)
+            _shared_pool = BrowserPool(
+                size=settings.getint('SELENIUM_POOL_SIZE', 3),
+                driver_factory=lambda: create_chrome_driver(page_load_timeout, script_timeout),
+                max_uses=settings.getint('SELENIUM_MAX_PAGES_PER_DRIVER', 50),
+            )
+            atexit.register(_shared_pool.close)
+        return _shared_pool
@@ -0,0 +1,294 @@
+"""
+Near-duplicate job detection with MinHash signatures and LSH banding.
+
+The same posting is often scraped twice: from keejob and tanitjobs, or
+under two URLs of the same site. Each job's title, company and description
+are reduced to a MinHash signature (num_perm 32-bit minimums over hashed
+word shingles); the fraction of equal signature values estimates the
+Jaccard similarity of two jobs' shingle sets. Signatures are split into
+``bands`` bands; jobs sharing one band are candidates (LSH), and a candidate
+is a duplicate when its estimated similarity reaches ``threshold``. With
+128 values in 16 bands of 8, a pair at similarity 0.8 becomes a candidate
+with probability ~0.95 and a pair at 0.5 with ~0.06, so only a handful of
+jobs are compared instead of all of them.
+
+Short postings are mostly boilerplate (sector, contract type, salary), so
+two different positions of one company can share most shingles: a second
+signature over the title words must also reach ``title_threshold``, which
+keeps apart e.g. the same position advertised for two cities. Jobs with
+no title or fewer than MIN_TOKENS words (failed extraction) all look alike:
+they get no signature and are never marked.
+
+Only canonical jobs (the first one seen of each cluster) are indexed, and
+duplicates point to their canonical job's URL in ``jobs.duplicate_of``.
+Signatures are stored in the ``job_signatures`` table of jobs.db so later
+crawls see the jobs of earlier ones.
+
+Backfill a database scraped before deduplication existed:
+
+    python -m job_scraper.dedup jobs.db
+"""
+import argparse
+import random
+import re
+import sqlite3
+import unicodedata
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+
+SIGNATURES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS job_signatures (
+        job_url TEXT PRIMARY KEY,
+        signature BLOB NOT NULL
+    )
+'''
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_TOKEN = re.compile(r'\w+')
+
+# Jobs with fewer words (failed extraction) are never signed nor marked
+MIN_TOKENS = 5
+
+
+def tokens(text):
+    """Lowercased, accent-free word tokens of two characters or more ("H/F" is dropped)"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return [token for token in _TOKEN.findall(text.lower()) if len(token) > 1]
+
+
+def shingle_hashes(text, size=3):
+    """32-bit hashes of the word ``size``-grams of ``text`` (the whole text when it is shorter)"""
+    words = tokens(text)
+    if not words:
+        return []
+    grams = {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return [int.from_bytes(blake2b(gram.encode('utf-8'), digest_size=4).digest(), 'little') for gram in grams]
+
+
+def job_text(title, company, description):
+    return ' '.join(part for part in (title, company, description) if part)
+
+
+class MinHasher:
+    """``num_perm`` universal hash functions (a * x + b) mod p applied to the shingle hashes"""
+
+    def __init__(self, num_perm=128, shingle_size=3, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+
+    def signature(self, text):
+        """MinHash signature of ``text``, or None when it has no tokens"""
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not hashes:
+            return None
+        return array('I', (
+            min((a * x + b) % _MERSENNE_PRIME for x in hashes) & 0xFFFFFFFF
+            for a, b in self.params
+        ))
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    if not signature:
+        return 0.0
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index over the signatures of canonical jobs.
+
+    A stored signature is the text signature followed by the title one.
+    Band keys (64-bit hashes of each band of the text signature, band
+    number included) are kept in one sorted array with the position of
+    their job, looked up with a binary search; jobs added during the crawl
+    go to a dict. A job takes (num_perm + title_perm) * 4 bytes plus 12
+    bytes per band.
+    """
+
+    def __init__(self, hasher=None, bands=16, threshold=0.8, title_perm=64, title_threshold=0.9):
+        self.hasher = hasher or MinHasher()
+        if self.hasher.num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({self.hasher.num_perm})")
+        self.title_hasher = MinHasher(title_perm, shingle_size=1, seed=2)
+        self.bands = bands
+        self.rows = self.hasher.num_perm // bands
+        self.threshold = threshold
+        self.title_threshold = title_threshold
+        self.size = self.hasher.num_perm + title_perm
+        self.urls = []
+        self.signatures = []
+        self.keys = array('q')
+        self.entries = array('i')
+        self.added = {}
+
+    @classmethod
+    def from_db(cls, db_path, **kwargs):
+        """Index the canonical jobs of ``db_path`` that have a signature"""
+        index = cls(**kwargs)
+        try:
+            conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        except sqlite3.OperationalError:
+            return index  # No database yet
+        try:
+            rows = conn.execute('''
+                SELECT s.job_url, s.signature FROM job_signatures s
+                JOIN jobs j ON j.job_url = s.job_url
+                WHERE j.duplicate_of IS NULL
+                ORDER BY j.id
+            ''').fetchall()
+        except sqlite3.OperationalError:
+            return index  # No signatures or duplicate_of column yet
+        finally:
+            conn.close()
+
+        pairs = []
+        for url, blob in rows:
+            signature = array('I')
+            signature.frombytes(blob)
+            if len(signature) != index.size:
+                continue  # Computed with other settings
+            pairs.extend((key, len(index.urls)) for key in index.band_keys(signature))
+            index.urls.append(url)
+            index.signatures.append(signature)
+        pairs.sort()
+        index.keys = array('q', (key for key, _ in pairs))
+        index.entries = array('i', (entry for _, entry in pairs))
+        return index
+
+    def __len__(self):
+        return len(self.urls)
+
+    def band_keys(self, signature):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            digest = blake2b(bytes([band]) + chunk.tobytes(), digest_size=8).digest()
+            yield int.from_bytes(digest, 'little', signed=True)
+
+    def candidates(self, keys):
+        found = set()
+        for key in keys:
+            i = bisect_left(self.keys, key)
+            while i < len(self.keys) and self.keys[i] == key:
+                found.add(self.entries[i])
+                i += 1
+            found.update(self.added.get(key, ()))
+        return found
+
+    def signature(self, title, company, description):
+        """Text signature followed by the title one, or None when the job has too few words to compare"""
+        text = job_text(title, company, description)
+        if len(tokens(text)) < MIN_TOKENS:
+            return None
+        title_signature = self.title_hasher.signature(title)
+        if title_signature is None:
+            return None
+        return self.hasher.signature(text) + title_signature
+
+    def find(self, signature, keys=None):
+        """(URL of the canonical job most similar to ``signature``, similarity), or (None, best similarity)"""
+        keys = list(self.band_keys(signature)) if keys is None else keys
+        n = self.hasher.num_perm
+        best, best_similarity = None, 0.0
+        for entry in self.candidates(keys):
+            other = self.signatures[entry]
+            if similarity(signature[n:], other[n:]) < self.title_threshold:
+                continue
+            score = similarity(signature[:n], other[:n])
+            if score > best_similarity:
+                best, best_similarity = entry, score
+        if best is not None and best_similarity >= self.threshold:
+            return self.urls[best], best_similarity
+        return None, best_similarity
+
+    def add(self, url, signature, keys=None):
+        entry = len(self.urls)
+        self.urls.append(url)
+        self.signatures.append(signature)
+        for key in (self.band_keys(signature) if keys is None else keys):
+            self.added.setdefault(key, []).append(entry)
+
+    def check(self, url, title, company, description):
+        """
+        Signature of a job and the canonical URL it duplicates (None when it is new).
+
+        New jobs become canonical: they are added to the index. Jobs without
+        a signature (see ``signature``) get (None, None) and are not added.
+        """
+        signature = self.signature(title, company, description)
+        if signature is None:
+            return None, None
+        keys = list(self.band_keys(signature))
+        canonical, _ = self.find(signature, keys)
+        if canonical == url:
+            canonical = None  # Same job scraped again
+        elif canonical is None:
+            self.add(url, signature, keys)
+        return signature, canonical
+
+
+def add_duplicate_column(conn):
+    """Add jobs.duplicate_of to databases created without it"""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+    if columns and 'duplicate_of' not in columns:
+        conn.execute('ALTER TABLE jobs ADD COLUMN duplicate_of TEXT')
+
+
+def ensure_schema(conn):
+    conn.execute(SIGNATURES_SCHEMA)
+    add_duplicate_column(conn)
+
+
+def backfill(db_path, num_perm=128, bands=16, threshold=0.8, title_threshold=0.9, shingle_size=3,
+             batch_size=1000):
+    """Sign every job of ``db_path`` without a signature, oldest first, and mark its duplicates"""
+    conn = sqlite3.connect(db_path)
+    with conn:
+        ensure_schema(conn)
+    index = NearDuplicateIndex.from_db(db_path, hasher=MinHasher(num_perm, shingle_size),
+                                       bands=bands, threshold=threshold, title_threshold=title_threshold)
+    rows = conn.execute('''
+        SELECT job_url, title, company, description FROM jobs
+        WHERE job_url IS NOT NULL AND job_url NOT IN (SELECT job_url FROM job_signatures)
+        ORDER BY id
+    ''').fetchall()
+    signed = duplicates = skipped = 0
+    for start in range(0, len(rows), batch_size):
+        signatures, marks = [], []
+        for url, title, company, description in rows[start:start + batch_size]:
+            signature, canonical = index.check(url, title, company, description)
+            if signature is None:
+                skipped += 1
+                continue
+            signatures.append((url, signature.tobytes()))
+            if canonical is not None:
+                marks.append((canonical, url))
+        with conn:
+            conn.executemany('INSERT OR IGNORE INTO job_signatures (job_url, signature) VALUES (?, ?)', signatures)
+            conn.executemany('UPDATE jobs SET duplicate_of = ? WHERE job_url = ?', marks)
+        signed += len(signatures)
+        duplicates += len(marks)
+    conn.close()
+    print(f"Signed {signed} jobs: {duplicates} near-duplicates, {len(index)} canonical jobs, "
+          f"{skipped} skipped (fewer than {MIN_TOKENS} words)")
+    return signed, duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mark near-duplicate jobs of an existing jobs.db")
+    parser.add_argument('db_path', nargs='?', default='jobs.db')
+    parser.add_argument('--threshold', type=float, default=0.8, help="Estimated Jaccard similarity of duplicates")
+    parser.add_argument('--title-threshold', type=float, default=0.9, help="... and of their titles")
+    parser.add_argument('--num-perm', type=int, default=128)
+    parser.add_argument('--bands', type=int, default=16)
+    args = parser.parse_args()
+    backfill(args.db_path, num_perm=args.num_perm, bands=args.bands, threshold=args.threshold,
+             title_threshold=args.title_threshold)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+import logging
+import time
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = {429, 503}
+
+
+class DomainState:
+    """Control state and counters of the current window for one download slot"""
+
+    def __init__(self, concurrency, delay):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latency_floor = None   # Lowest window latency seen: the uncongested baseline
+        self.latency_ewma = None
+        self.last_decrease = 0.0
+        self.reset_window()
+
+    def reset_window(self):
+        self.responses = 0          # Successful responses (not throttled, not 5xx)
+        self.errors = 0
+        self.throttled = 0
+        self.latency_total = 0.0
+        self.saturated = False
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency and delay control per download slot (domain).
+
+    Every ADAPTIVE_INTERVAL seconds, a domain that kept its slot busy without
+    throttling, errors or rising latency gets more throughput (additive
+    increase): first one more request per second by shortening its delay,
+    down to ADAPTIVE_MIN_DELAY, then one more concurrent request, up to
+    ADAPTIVE_MAX_CONCURRENCY. A 429/503 halves the request rate at once
+    (multiplicative decrease): the concurrency is halved, or the delay
+    doubled when the concurrency is already at ADAPTIVE_MIN_CONCURRENCY.
+    An error rate above ADAPTIVE_ERROR_RATE, or a mean latency above
+    ADAPTIVE_LATENCY_FACTOR times the lowest one seen, backs off by one
+    step.
+
+    New slots start from CONCURRENT_REQUESTS_PER_DOMAIN and DOWNLOAD_DELAY.
+    Each window is appended to the adaptive/<domain>/series stat.
+    """
+
+    min_latency_signal = 0.25  # Seconds; latency changes below this are noise
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.min_concurrency = settings.getint('ADAPTIVE_MIN_CONCURRENCY', 1)
+        self.max_concurrency = settings.getint('ADAPTIVE_MAX_CONCURRENCY', 16)
+        self.min_delay = settings.getfloat('ADAPTIVE_MIN_DELAY', 0.0)
+        self.max_delay = settings.getfloat('ADAPTIVE_MAX_DELAY', 60.0)
+        self.interval = settings.getfloat('ADAPTIVE_INTERVAL', 5.0)
+        self.error_rate = settings.getfloat('ADAPTIVE_ERROR_RATE', 0.1)
+        self.latency_factor = settings.getfloat('ADAPTIVE_LATENCY_FACTOR', 3.0)
+        self.domains = {}
+        self.answered = set()  # Requests in the downloader that got a response
+        self.started = None
+        self.loop = None
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(self.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(self.request_left_downloader, signal=signals.request_left_downloader)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+        self.loop = task.LoopingCall(self.tick)
+        self.loop.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.loop and self.loop.running:
+            self.loop.stop()
+        self.tick()
+        for key, state in self.domains.items():
+            self.stats.set_value(f'adaptive/{key}/final_concurrency', state.concurrency)
+            self.stats.set_value(f'adaptive/{key}/final_delay', round(state.delay, 3))
+
+    def slot(self, request):
+        key = request.meta.get('download_slot')
+        if key is None:
+            return None, None
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def request_reached_downloader(self, request, spider):
+        key, slot = self.slot(request)
+        if slot is None:
+            return
+        state = self.domains.get(key)
+        if state is None:
+            state = self.domains[key] = DomainState(slot.concurrency, slot.delay)
+        # Slots are garbage-collected when idle: re-apply the current values
+        slot.concurrency = state.concurrency
+        slot.delay = state.delay
+        if slot.queue or len(slot.transferring) >= slot.concurrency:
+            state.saturated = True
+
+    def response_downloaded(self, response, request, spider):
+        key, slot = self.slot(request)
+        state = self.domains.get(key)
+        if state is None:
+            return
+        self.answered.add(request)
+        if response.status in THROTTLE_STATUSES:
+            state.throttled += 1
+            self.stats.inc_value(f'adaptive/{key}/throttled')
+            self.back_off(key, state, slot, response)
+        elif response.status >= 500:
+            state.errors += 1
+        else:
+            # Throttled and error responses are fast and would hide congestion
+            latency = request.meta.get('download_latency', 0.0)
+            state.responses += 1
+            state.latency_total += latency
+            state.latency_ewma = latency if state.latency_ewma is None else 0.8 * state.latency_ewma + 0.2 * latency
+
+    def request_left_downloader(self, request, spider):
+        # Requests that left without a response failed (timeout, connection error...)
+        if request in self.answered:
+            self.answered.discard(request)
+        else:
+            state = self.domains.get(request.meta.get('download_slot'))
+            if state is not None:
+                state.errors += 1
+
+    def back_off(self, key, state, slot, response):
+        """Multiplicative decrease, at most once per interval"""
+        now = time.monotonic()
+        if now - state.last_decrease < self.interval:
+            return
+        state.last_decrease = now
+        if state.concurrency > self.min_concurrency:
+            state.concurrency = max(self.min_concurrency, state.concurrency // 2)
+        else:
+            self.slow_down(state, 2.0)
+        self.apply(state, slot)
+        self.stats.inc_value(f'adaptive/{key}/decreases')
+        logger.info(
+            f"{key}: throttled ({response.status}), concurrency={state.concurrency} delay={state.delay:.2f}s"
+        )
+
+    def tick(self):
+        """Close the current window of every domain: record it, then adjust"""
+        elapsed = time.monotonic() - self.started
+        downloader = self.crawler.engine.downloader if self.crawler.engine else None
+        for key, state in self.domains.items():
+            if state.responses or state.errors or state.throttled:
+                self.record(key, state, elapsed)
+                self.adjust(key, state, downloader.slots.get(key) if downloader else None)
+            state.reset_window()
+
+    def record(self, key, state, elapsed):
+        latency = state.latency_total / state.responses if state.responses else 0.0
+        series = self.stats.get_value(f'adaptive/{key}/series') or []
+        series.append({
+            't': round(elapsed, 1),
+            'concurrency': state.concurrency,
+            'delay': round(state.delay, 3),
+            'responses_per_sec': round(state.responses / self.interval, 2),
+            'latency_ms': round(latency * 1000),
+            'throttled': state.throttled,
+            'errors': state.errors,
+        })
+        self.stats.set_value(f'adaptive/{key}/series', series)
+        self.stats.max_value(f'adaptive/{key}/max_responses_per_sec', series[-1]['responses_per_sec'])
+
+    def adjust(self, key, state, slot):
+        if state.throttled:
+            return  # Already handled by back_off()
+
+        total = state.responses + state.errors
+        latency = state.latency_total / state.responses if state.responses else 0.0
+        if state.responses:
+            state.latency_floor = latency if state.latency_floor is None else min(state.latency_floor, latency)
+
+        congested = (
+            state.errors / total > self.error_rate
+            or (latency > self.min_latency_signal and latency > self.latency_factor * state.latency_floor)
+        )
+        if congested:
+            if state.concurrency > self.min_concurrency:
+                state.concurrency -= 1
+            else:
+                self.slow_down(state, 1.5)
+            self.stats.inc_value(f'adaptive/{key}/decreases')
+        elif state.saturated:
+            if state.delay > self.min_delay:
+                # One more request per second; below 50ms the delay is dropped
+                delay = 1 / (1 / state.delay + 1)
+                state.delay = delay if delay > max(self.min_delay, 0.05) else self.min_delay
+            elif state.concurrency < self.max_concurrency:
+                state.concurrency += 1
+            else:
+                return
+            self.stats.inc_value(f'adaptive/{key}/increases')
+        else:
+            return
+        self.apply(state, slot)
+        self.stats.max_value(f'adaptive/{key}/max_concurrency', state.concurrency)
+
+    def slow_down(self, state, factor):
+        """Divide the request rate of a single-connection slot by ``factor``"""
+        if state.delay > 0:
+            interval = state.delay
+        elif state.latency_ewma:
+            interval = state.latency_ewma / state.concurrency
+        else:
+            interval = 0.5
+        state.delay = min(self.max_delay, interval * factor)
+
+    @staticmethod
+    def apply(state, slot):
+        if slot is not None:
+            slot.concurrency = state.concurrency
+            slot.delay = state.delay
@@ -0,0 +1,62 @@
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+_translator = HTMLTranslator()
+
+
+def normalize_space(text):
+    """Collapse runs of whitespace (spaces, tabs, newlines) into single spaces"""
+    if not text:
+        return text
+    return ' '.join(text.split())
+
+
+class Field:
+    """
+    One item field, declared as a CSS selector (comma-separated fallbacks allowed).
+
+    The selector is translated to XPath and compiled once, with the same
+    translator as ``response.css()``. By default the value is the first
+    match in document order, like ``.get()``; with ``join=True`` every
+    matched text node is joined, like ``' '.join(.getall())``. Values are
+    returned whitespace-normalized.
+    """
+
+    def __init__(self, css, join=False):
+        self.css = css
+        self.join = join
+        self.xpath = etree.XPath(_translator.css_to_xpath(css))
+
+    def extract(self, root):
+        values = self.xpath(root)
+        if not values:
+            return None
+        if self.join:
+            return normalize_space(' '.join(values))
+        return normalize_space(values[0])
+
+
+class Extractor:
+    """
+    Set of fields extracted from the same page.
+
+    Fields run against the lxml tree the response already parsed, without
+    building a Selector per query.
+    """
+
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def extract(self, response, **known):
+        """
+        Return a dict of normalized field values.
+
+        Fields passed in ``known`` (e.g. values taken from the listing page)
+        are used as they are when not empty, and their selectors are skipped.
+        """
+        root = response.selector.root
+        values = {}
+        for name, field in self.fields.items():
+            value = normalize_space(known.get(name))
+            values[name] = value if value else field.extract(root)
+        return values
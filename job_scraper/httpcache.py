@@ -0,0 +1,163 @@
+import logging
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+from scrapy.extensions.httpcache import RFC2616Policy
+from scrapy.utils.project import data_path
+from scrapy.utils.response import response_from_dict
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+logger = logging.getLogger(__name__)
+
+
+class RevalidatingPolicy(RFC2616Policy):
+    """
+    RFC 2616 policy that stores every successful page.
+
+    Only explicit freshness (Cache-Control max-age, Expires) is honored, not
+    RFC2616Policy's Last-Modified heuristic. Job boards rarely send either,
+    so pages are stale as soon as they are cached: each revisit is sent with If-None-Match/If-Modified-Since
+    when the page had an ETag/Last-Modified, and a 304 is answered from the
+    cache. Pages are stored even without validators so that a crawl can be
+    replayed offline. Challenge pages and errors (HTTPCACHE_IGNORE_HTTP_CODES)
+    are never stored.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.ignore_http_codes = {int(code) for code in settings.getlist('HTTPCACHE_IGNORE_HTTP_CODES')}
+
+    def should_cache_response(self, response, request):
+        if response.status in self.ignore_http_codes:
+            return False
+        return super().should_cache_response(response, request)
+
+    def _compute_freshness_lifetime(self, response, request, now):
+        # The heuristic would serve a listing modified 10 days ago from the
+        # cache for a day without asking the server
+        if b'Expires' in response.headers or self._get_max_age(self._parse_cachecontrol(response)) is not None:
+            return super()._compute_freshness_lifetime(response, request, now)
+        return 0
+
+
+class SqliteCacheStorage:
+    """
+    HTTP cache storage in a single SQLite file per spider.
+
+    Entries are keyed by the request fingerprint (REQUEST_FINGERPRINTER_IMPLEMENTATION)
+    and hold the response status, URL and zlib-compressed headers and body.
+    When the compressed size goes over HTTPCACHE_MAX_BYTES, the least
+    recently used entries are evicted down to 90% of the limit.
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.max_bytes = settings.getint('HTTPCACHE_MAX_BYTES', 0)
+        self.compression_level = settings.getint('HTTPCACHE_COMPRESSION_LEVEL', 6)
+        self.conn = None
+        self.stats = None
+        self.total_bytes = 0
+        self.touched = {}  # fingerprint -> last access, written in batches
+
+    def open_spider(self, spider):
+        dbpath = Path(self.cachedir, f'{spider.name}.sqlite')
+        self.conn = sqlite3.connect(str(dbpath))
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                fingerprint BLOB PRIMARY KEY,
+                url TEXT,
+                status INTEGER,
+                headers BLOB,
+                body BLOB,
+                size INTEGER,
+                stored_at REAL,
+                accessed_at REAL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        self.stats = spider.crawler.stats
+        self.stats.set_value('httpcache/bytes', self.total_bytes)
+        logger.debug(f"Using SQLite cache storage in {dbpath} ({self.total_bytes} bytes)")
+
+    def close_spider(self, spider):
+        self._write_touched()
+        self.conn.close()
+
+    def retrieve_response(self, spider, request):
+        """Return response if present in cache, or None otherwise"""
+        key = self._fingerprinter.fingerprint(request)
+        row = self.conn.execute(
+            'SELECT url, status, headers, body, stored_at FROM responses WHERE fingerprint = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None  # not cached
+        url, status, headers, body, stored_at = row
+        if 0 < self.expiration_secs < time.time() - stored_at:
+            return None  # expired
+
+        self.touched[key] = time.time()
+        if len(self.touched) >= 100:
+            self._write_touched()
+
+        request.meta['cache_timestamp'] = stored_at
+        return response_from_dict({
+            'url': url,
+            'status': status,
+            'headers': headers_raw_to_dict(zlib.decompress(headers)),
+            'body': zlib.decompress(body),
+        })
+
+    def store_response(self, spider, request, response):
+        """Store the given response in the cache"""
+        key = self._fingerprinter.fingerprint(request)
+        headers = zlib.compress(headers_dict_to_raw(response.headers), self.compression_level)
+        body = zlib.compress(response.body, self.compression_level)
+        size = len(headers) + len(body)
+        now = time.time()
+
+        with self.conn:
+            old = self.conn.execute('SELECT size FROM responses WHERE fingerprint = ?', (key,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, response.url, response.status, headers, body, size, now, now)
+            )
+        self.touched.pop(key, None)
+        self.total_bytes += size - (old[0] if old else 0)
+        self.stats.inc_value('httpcache/bytes_stored', size)
+        self.stats.inc_value('httpcache/bytes_uncompressed', len(response.body))
+
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            self.evict(int(self.max_bytes * 0.9))
+        self.stats.set_value('httpcache/bytes', self.total_bytes)
+
+    def evict(self, target_bytes):
+        """Delete least recently used entries until the cache fits in target_bytes"""
+        self._write_touched()
+        evicted = []
+        for key, size in self.conn.execute('SELECT fingerprint, size FROM responses ORDER BY accessed_at'):
+            if self.total_bytes <= target_bytes:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        with self.conn:
+            self.conn.executemany('DELETE FROM responses WHERE fingerprint = ?', evicted)
+        self.stats.inc_value('httpcache/evicted', len(evicted))
+        logger.debug(f"Evicted {len(evicted)} cached responses ({self.total_bytes} bytes left)")
+
+    def _write_touched(self):
+        if not self.touched:
+            return
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE responses SET accessed_at = ? WHERE fingerprint = ?',
+                [(ts, key) for key, ts in self.touched.items()]
+            )
+        self.touched.clear()
@@ -19,4 +19,6 @@ class JobItem(scrapy.Item):
     posted_date = scrapy.Field()
     source_website = scrapy.Field()
     job_url = scrapy.Field()
-    scraped_at = scrapy.Field()  
\ No newline at end of file
+    scraped_at = scrapy.Field()
+    # job_url of the job this one is a near-duplicate of (NearDuplicatePipeline)
+    duplicate_of = scrapy.Field()  
\ No newline at end of file
@@ -4,10 +4,17 @@
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 from scrapy import signals
+from scrapy.http import HtmlResponse
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy.utils.httpobj import urlparse_cached
+from selenium.webdriver.support.ui import WebDriverWait
+from twisted.internet import threads
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from job_scraper.browser_pool import get_browser_pool
+
 
 class JobScraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -36,6 +43,11 @@ class JobScraperSpiderMiddleware:
         for i in result:
             yield i
 
+    async def process_spider_output_async(self, response, result, spider):
+        # Same as process_spider_output(), for async callbacks.
+        async for i in result:
+            yield i
+
     def process_spider_exception(self, response, exception, spider):
         # Called when a spider or process_spider_input() method
         # (from other spider middleware) raises an exception.
@@ -53,48 +65,121 @@ class JobScraperSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
-class JobScraperDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
-
+class BrowserFallbackMiddleware:
+    """
+    Fetch every request with Scrapy's downloader first and only fall back to
+    a headless browser when needed.
+    
+    A response goes to the browser renderer when it is a Cloudflare/JS
+    challenge (HTTP 403/503 with a cf-mitigated header or an interstitial
+    page), or when ``request.meta['browser_required_css']`` is set and the
+    HTML has no element matching it. Rendering runs in a worker thread with a
+    driver from the shared BrowserPool; if the spider defines
+    ``render_page(driver, url)`` it is used and its return value is stored in
+    ``response.meta['browser_result']``. Cookies set while the browser solved
+    a challenge (e.g. cf_clearance) are reused on later plain HTTP requests to
+    the same host.
+    
+    Stats: fetch/http, fetch/browser, fetch/challenges, fetch/browser_ratio.
+    """
+    
+    CHALLENGE_STATUSES = {403, 503}
+    # Interstitial page content; '/cdn-cgi/challenge-platform/' is left out on
+    # purpose, Cloudflare injects that script into ordinary pages too
+    CHALLENGE_MARKERS = (
+        b'cf-browser-verification',
+        b'cf_chl_opt',
+        b'<title>Just a moment...</title>',
+        b'Checking your browser before accessing',
+        b'Enable JavaScript and cookies to continue',
+    )
+    
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.enabled = crawler.settings.getbool('BROWSER_FALLBACK_ENABLED', True)
+        self.pool = None
+        # host -> {cookie name: value} obtained by the browser
+        self.solved_cookies = {}
+    
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
+        s = cls(crawler)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
-
+    
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        # Reuse cookies the browser got when it solved a challenge for this host
+        cookies = self.solved_cookies.get(urlparse_cached(request).hostname)
+        if cookies and isinstance(request.cookies, dict) and not request.meta.get('dont_merge_cookies'):
+            request.cookies = {**cookies, **request.cookies}
         return None
-
-    def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
-        return response
-
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
-
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
-
+    
+    async def process_response(self, request, response, spider):
+        if not self.enabled or request.meta.get('browser_rendered'):
+            return response
+        
+        reason = self.browser_reason(request, response)
+        if reason is None:
+            self.count('fetch/http')
+            return response
+        
+        spider.logger.info(f"🌐 {reason} on {response.url} (HTTP {response.status}), rendering in browser")
+        self.stats.inc_value(f'fetch/{reason}')
+        url, body, cookies, result = await maybe_deferred_to_future(
+            threads.deferToThread(self.render, request, spider)
+        )
+        
+        host = urlparse_cached(request).hostname
+        self.solved_cookies.setdefault(host, {}).update({c['name']: c['value'] for c in cookies})
+        
+        self.count('fetch/browser')
+        request.meta['browser_rendered'] = True
+        if result is not None:
+            request.meta['browser_result'] = result
+        return HtmlResponse(url=url, body=body, encoding='utf-8', request=request, flags=['browser'])
+    
+    def browser_reason(self, request, response):
+        """Why the response needs a browser ('challenges' or 'js_required'), or None"""
+        # A challenge is served with 403/503, flagged by the cf-mitigated
+        # header or recognizable by its interstitial page
+        if response.status in self.CHALLENGE_STATUSES and (
+            b'cf-mitigated' in response.headers
+            or any(marker in response.body[:65536] for marker in self.CHALLENGE_MARKERS)
+        ):
+            return 'challenges'
+        
+        required_css = request.meta.get('browser_required_css')
+        if required_css and isinstance(response, HtmlResponse) and not response.css(required_css):
+            return 'js_required'
+        return None
+    
+    def render(self, request, spider):
+        """Render the request URL in a pooled browser (runs in a worker thread)"""
+        if self.pool is None:
+            self.pool = get_browser_pool(self.crawler.settings)
+        with self.pool.driver() as driver:
+            render_page = getattr(spider, 'render_page', None)
+            if render_page is not None:
+                result = render_page(driver, request.url)
+            else:
+                driver.get(request.url)
+                WebDriverWait(driver, 15, poll_frequency=0.2).until(
+                    lambda d: d.execute_script("return document.readyState") == "complete"
+                )
+                result = None
+            return driver.current_url, driver.page_source, driver.get_cookies(), result
+    
+    def count(self, key):
+        self.stats.inc_value(key)
+        http = self.stats.get_value('fetch/http', 0)
+        browser = self.stats.get_value('fetch/browser', 0)
+        self.stats.set_value('fetch/browser_ratio', round(browser / (http + browser), 3))
+    
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+    
+    def spider_closed(self, spider):
+        if self.pool is not None:
+            spider.logger.info(f"✅ Browser pool stats: {self.pool.stats}")
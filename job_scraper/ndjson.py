@@ -0,0 +1,155 @@
+import gzip
+import json
+import os
+import re
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+SUFFIXES = {'none': '.ndjson', 'gzip': '.ndjson.gz', 'zstd': '.ndjson.zst'}
+
+# Raised when reading a truncated part (backend/export_reader.py has the same)
+READ_ERRORS = (EOFError, OSError, ValueError, RuntimeError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def open_part(path, mode, level=None):
+    """
+    Open an export part for reading ('rb') or appending ('ab').
+
+    Compression follows the file suffix. Appending to a compressed part adds
+    a new gzip member / zstd frame, which readers see as one stream.
+    backend/export_reader.py has its own copy of the reading side, as the
+    backend does not import the scraper package.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, compresslevel=level or 6)
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed, cannot open " + path)
+        raw = open(path, mode)
+        if 'r' in mode:
+            return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return zstandard.ZstdCompressor(level=level or 3).stream_writer(raw, closefd=True)
+    return open(path, mode)
+
+
+class NdjsonWriter:
+    """
+    Writes items as NDJSON to numbered parts: <directory>/<name>-00001.ndjson[.gz|.zst]
+
+    Lines are buffered and written buffer_items at a time. A new part is
+    started once the current one holds max_items items or max_bytes bytes
+    of (uncompressed) JSON. On open, writing resumes in the last part when
+    it still has room, so exports of successive runs append to each other;
+    a plain part cut mid-line by a crash is first trimmed to its last line.
+    """
+
+    def __init__(self, directory, name, compression='gzip', max_items=50000,
+                 max_bytes=64 * 1024 * 1024, buffer_items=500, level=None):
+        if compression not in SUFFIXES:
+            raise ValueError(f"Unknown compression {compression!r} (expected one of {', '.join(SUFFIXES)})")
+        if compression == 'zstd' and zstandard is None:
+            raise RuntimeError("zstd compression requires the zstandard package")
+        self.directory = directory
+        self.name = name
+        self.suffix = SUFFIXES[compression]
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.buffer_items = buffer_items
+        self.level = level
+        self.buffer = []
+        self.file = None
+        self.part = 0
+        self.part_items = 0
+        self.part_bytes = 0
+        self.items_written = 0
+        self.parts_opened = 0
+
+    def part_path(self, part):
+        return os.path.join(self.directory, f'{self.name}-{part:05d}{self.suffix}')
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        pattern = re.compile(rf'^{re.escape(self.name)}-(\d+){re.escape(self.suffix)}$')
+        parts = sorted(int(m.group(1)) for m in map(pattern.match, os.listdir(self.directory)) if m)
+        self.part = parts[-1] if parts else 1
+        self.part_items, self.part_bytes = 0, 0
+        if parts:
+            if self.suffix == SUFFIXES['none']:
+                # A crash can leave a plain part ending in a partial line:
+                # drop it so the next line is not glued onto it
+                trim_partial_line(self.part_path(self.part))
+            try:
+                self.part_items, self.part_bytes = count_lines(self.part_path(self.part))
+            except READ_ERRORS:
+                # Truncated by a crash (or unreadable): leave it as it is
+                self.part_items, self.part_bytes = self.max_items, self.max_bytes
+        if self.full():
+            self.part += 1
+            self.part_items, self.part_bytes = 0, 0
+        self.file = open_part(self.part_path(self.part), 'ab', self.level)
+        self.parts_opened += 1
+
+    def full(self):
+        return self.part_items >= self.max_items or self.part_bytes >= self.max_bytes
+
+    def write(self, item):
+        self.buffer.append(json.dumps(item, ensure_ascii=False, default=str))
+        if len(self.buffer) >= self.buffer_items:
+            self.flush()
+
+    def flush(self):
+        """Write buffered lines, rotating to a new part when the current one is full"""
+        lines, self.buffer = self.buffer, []
+        while lines:
+            if self.file is None:
+                self.open()
+            elif self.full():
+                self.file.close()
+                self.part += 1
+                self.part_items, self.part_bytes = 0, 0
+                self.file = open_part(self.part_path(self.part), 'ab', self.level)
+                self.parts_opened += 1
+            room = self.max_items - self.part_items
+            chunk, lines = lines[:room], lines[room:]
+            data = ('\n'.join(chunk) + '\n').encode('utf-8')
+            self.file.write(data)
+            self.part_items += len(chunk)
+            self.part_bytes += len(data)
+            self.items_written += len(chunk)
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def trim_partial_line(path, block_size=64 * 1024):
+    """Cut a plain part back to its last newline; returns the number of bytes removed"""
+    with open(path, 'rb+') as f:
+        size = end = f.seek(0, os.SEEK_END)
+        keep = 0
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            end = start
+        if keep < size:
+            f.truncate(keep)
+        return size - keep
+
+
+def count_lines(path):
+    """Number of lines and uncompressed bytes of an export part"""
+    lines = size = 0
+    with open_part(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+            size += len(block)
+    return lines, size
@@ -0,0 +1,84 @@
+"""
+Run every spider of the project concurrently in one process.
+
+All crawlers share the Twisted reactor and, through JobScraperPipeline, a
+single SQLite connection: items from every spider go through one writer.
+A combined report with per-spider items/sec is printed at the end.
+
+Usage:
+    python -m job_scraper.orchestrator
+    python -m job_scraper.orchestrator --spiders keejob tanitjobs -s INCREMENTAL_CRAWL=0
+    python -m job_scraper.orchestrator --report-json crawl_report.json
+"""
+import argparse
+import json
+import time
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+
+def spider_report(crawler):
+    stats = crawler.stats.get_stats()
+    elapsed = stats.get('elapsed_time_seconds') or 0.0
+    items = stats.get('item_scraped_count', 0)
+    return {
+        'spider': crawler.spidercls.name,
+        'items': items,
+        'written': stats.get('sqlite/items_written', 0),
+        'ignored': stats.get('sqlite/items_ignored', 0),
+        'requests': stats.get('downloader/request_count', 0),
+        'errors': stats.get('log_count/ERROR', 0),
+        'elapsed_seconds': round(elapsed, 1),
+        'items_per_sec': round(items / elapsed, 2) if elapsed else 0.0,
+        'finish_reason': stats.get('finish_reason'),
+    }
+
+
+def print_report(reports, wall_seconds):
+    print(f"\n{'spider':<12} {'items':>7} {'written':>8} {'ignored':>8} {'requests':>9} "
+          f"{'errors':>7} {'time (s)':>9} {'items/s':>8}  finish")
+    for r in reports:
+        print(f"{r['spider']:<12} {r['items']:>7} {r['written']:>8} {r['ignored']:>8} {r['requests']:>9} "
+              f"{r['errors']:>7} {r['elapsed_seconds']:>9} {r['items_per_sec']:>8}  {r['finish_reason']}")
+    items = sum(r['items'] for r in reports)
+    rate = items / wall_seconds if wall_seconds else 0.0
+    print(f"{'total':<12} {items:>7} {sum(r['written'] for r in reports):>8} "
+          f"{sum(r['ignored'] for r in reports):>8} {sum(r['requests'] for r in reports):>9} "
+          f"{sum(r['errors'] for r in reports):>7} {wall_seconds:>9.1f} {rate:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all job spiders concurrently into one database")
+    parser.add_argument('--spiders', nargs='+', help="Spiders to run (default: every spider in SPIDER_MODULES)")
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE',
+                        help="Override a setting, as with scrapy crawl -s")
+    parser.add_argument('--report-json', help="Also write the run report to this file")
+    args = parser.parse_args()
+
+    settings = get_project_settings()
+    for override in args.set:
+        name, _, value = override.partition('=')
+        settings.set(name, value, priority='cmdline')
+
+    process = CrawlerProcess(settings)
+    names = args.spiders or process.spider_loader.list()
+    crawlers = []
+    for name in names:
+        crawler = process.create_crawler(name)
+        process.crawl(crawler)
+        crawlers.append(crawler)
+
+    started = time.monotonic()
+    process.start()
+    wall_seconds = time.monotonic() - started
+
+    reports = [spider_report(crawler) for crawler in crawlers]
+    print_report(reports, wall_seconds)
+    if args.report_json:
+        with open(args.report_json, 'w', encoding='utf-8') as f:
+            json.dump({'wall_seconds': round(wall_seconds, 1), 'spiders': reports}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
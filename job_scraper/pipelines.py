@@ -1,21 +1,207 @@
-import json
 import sqlite3
+import time
 from datetime import datetime
 from itemadapter import ItemAdapter
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from job_scraper.dedup import MinHasher, NearDuplicateIndex, add_duplicate_column, ensure_schema
+from job_scraper.ndjson import NdjsonWriter, zstandard
+
+
+# One connection per database file, shared by every crawler of the process
+# (see job_scraper.orchestrator): writes from all spiders go through it
+_connections = {}
+
+
+def acquire_connection(db_path, pragmas=None, busy_timeout=30.0):
+    """Open (or reuse) the shared connection to ``db_path`` and hold a reference to it"""
+    entry = _connections.get(db_path)
+    if entry is None:
+        # busy_timeout: wait for other processes (indexer, another crawl)
+        # to release their lock instead of failing with "database is locked"
+        conn = sqlite3.connect(db_path, timeout=busy_timeout)
+        for name, value in (pragmas or {}).items():
+            conn.execute(f'PRAGMA {name}={value}')
+        entry = _connections[db_path] = [conn, 0]
+    entry[1] += 1
+    return entry[0]
+
+
+def release_connection(db_path):
+    """Drop a reference to the shared connection, closing it with the last one"""
+    entry = _connections.get(db_path)
+    if entry is None:
+        return
+    entry[1] -= 1
+    if entry[1] <= 0:
+        entry[0].close()
+        del _connections[db_path]
+
+
+# One near-duplicate index per database file, shared like the connections
+_dedup_indexes = {}
+
+
+class NearDuplicatePipeline:
+    """
+    Pipeline to mark near-duplicate jobs before they are stored
+
+    Each item gets a MinHash signature of its title, company and description
+    (see job_scraper.dedup). When it matches a job already seen, in this
+    crawl, by another spider of the process or in an earlier crawl, its
+    duplicate_of field is set to that job's URL. The item is still stored
+    but the backend indexer does not embed it. Signatures are saved to
+    the job_signatures table in batches of SQLITE_BATCH_SIZE.
+    """
+    
+    insert_sql = 'INSERT OR IGNORE INTO job_signatures (job_url, signature) VALUES (?, ?)'
+    
+    def __init__(self, db_path='jobs.db', threshold=0.8, title_threshold=0.9, num_perm=128, bands=16,
+                 batch_size=100, pragmas=None, busy_timeout=30.0, stats=None):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.title_threshold = title_threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.batch_size = batch_size
+        self.pragmas = pragmas or {}
+        self.busy_timeout = busy_timeout
+        self.stats = stats
+        self.conn = None
+        self.index = None
+        self.buffer = []
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('DEDUP_ENABLED', True):
+            raise NotConfigured
+        return cls(
+            db_path=settings.get('SQLITE_DB_PATH', 'jobs.db'),
+            threshold=settings.getfloat('DEDUP_THRESHOLD', 0.8),
+            title_threshold=settings.getfloat('DEDUP_TITLE_THRESHOLD', 0.9),
+            num_perm=settings.getint('DEDUP_NUM_PERM', 128),
+            bands=settings.getint('DEDUP_BANDS', 16),
+            batch_size=settings.getint('SQLITE_BATCH_SIZE', 100),
+            pragmas=settings.getdict('SQLITE_PRAGMAS'),
+            busy_timeout=settings.getfloat('SQLITE_BUSY_TIMEOUT', 30.0),
+            stats=crawler.stats,
+        )
+    
+    def open_spider(self, spider):
+        self.conn = acquire_connection(self.db_path, self.pragmas, self.busy_timeout)
+        with self.conn:
+            ensure_schema(self.conn)
+        entry = _dedup_indexes.get(self.db_path)
+        if entry is None:
+            start = time.perf_counter()
+            index = NearDuplicateIndex.from_db(
+                self.db_path, hasher=MinHasher(self.num_perm), bands=self.bands,
+                threshold=self.threshold, title_threshold=self.title_threshold,
+            )
+            spider.logger.info(f"Near-duplicate index: {len(index)} canonical jobs loaded "
+                               f"in {time.perf_counter() - start:.2f}s")
+            entry = _dedup_indexes[self.db_path] = [index, 0]
+        entry[1] += 1
+        self.index = entry[0]
+    
+    def close_spider(self, spider):
+        self.flush(spider)
+        entry = _dedup_indexes.get(self.db_path)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del _dedup_indexes[self.db_path]
+        release_connection(self.db_path)
+    
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        url = adapter.get('job_url')
+        if not url:
+            return item
+        signature, canonical = self.index.check(
+            url, adapter.get('title'), adapter.get('company'), adapter.get('description')
+        )
+        adapter['duplicate_of'] = canonical
+        if signature is None:
+            # Too few words to compare (e.g. failed extraction): kept as is
+            if self.stats:
+                self.stats.inc_value('dedup/unsigned')
+            return item
+        self.buffer.append((url, signature.tobytes()))
+        if self.stats:
+            self.stats.inc_value('dedup/duplicates' if canonical else 'dedup/canonical')
+        if canonical:
+            spider.logger.debug(f"Near-duplicate: {url} -> {canonical}")
+        if len(self.buffer) >= self.batch_size:
+            self.flush(spider)
+        return item
+    
+    def flush(self, spider):
+        rows, self.buffer = self.buffer, []
+        if not rows:
+            return
+        try:
+            with self.conn:
+                self.conn.executemany(self.insert_sql, rows)
+        except sqlite3.Error as e:
+            spider.logger.error(f"Database error while saving {len(rows)} job signatures: {e}")
 
 
 class JobScraperPipeline:
     """
     Pipeline to store scraped jobs in SQLite database
+
+    Items are buffered and written with a single executemany() per
+    transaction. The buffer is flushed when it reaches SQLITE_BATCH_SIZE
+    items, when SQLITE_FLUSH_INTERVAL seconds have passed since the last
+    flush, and when the spider closes. A batch that fails is retried row by
+    row, so only the offending items are lost (sqlite/items_failed).
+
+    Pipelines of crawlers running in the same process share one connection
+    per database file, so concurrent spiders never compete for the write lock.
     """
     
-    def __init__(self):
+    insert_sql = '''
+        INSERT OR IGNORE INTO jobs (
+            title, company, location, sector, description, 
+            salary, contract_type, posted_date, source_website, 
+            job_url, scraped_at, duplicate_of
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    def __init__(self, db_path='jobs.db', batch_size=100, flush_interval=5.0,
+                 pragmas=None, busy_timeout=30.0, stats=None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pragmas = pragmas or {}
+        self.busy_timeout = busy_timeout
+        self.stats = stats
         self.conn = None
         self.cur = None
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.flush_loop = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            db_path=settings.get('SQLITE_DB_PATH', 'jobs.db'),
+            batch_size=settings.getint('SQLITE_BATCH_SIZE', 100),
+            flush_interval=settings.getfloat('SQLITE_FLUSH_INTERVAL', 5.0),
+            pragmas=settings.getdict('SQLITE_PRAGMAS'),
+            busy_timeout=settings.getfloat('SQLITE_BUSY_TIMEOUT', 30.0),
+            stats=crawler.stats,
+        )
     
     def open_spider(self, spider):
         """Called when spider opens - create database connection"""
-        self.conn = sqlite3.connect('jobs.db')
+        # Tuning PRAGMAs (journal_mode=WAL, synchronous, cache_size, ...) are
+        # applied when the shared connection is first opened
+        self.conn = acquire_connection(self.db_path, self.pragmas, self.busy_timeout)
         self.cur = self.conn.cursor()
         
         # Create table if it doesn't exist
@@ -32,14 +218,25 @@ class JobScraperPipeline:
                 posted_date TEXT,
                 source_website TEXT,
                 job_url TEXT UNIQUE,
-                scraped_at TEXT
+                scraped_at TEXT,
+                duplicate_of TEXT
             )
         ''')
+        add_duplicate_column(self.conn)
         self.conn.commit()
+        
+        # Flush on the time threshold even when no new items arrive
+        if self.flush_interval > 0:
+            self.flush_loop = task.LoopingCall(self.flush_if_due, spider)
+            self.flush_loop.start(self.flush_interval, now=False)
     
     def close_spider(self, spider):
-        """Called when spider closes - close database connection"""
-        self.conn.close()
+        """Called when spider closes - flush pending items and close connection"""
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
+        self.flush(spider)
+        self.cur.close()
+        release_connection(self.db_path)
     
     def process_item(self, item, spider):
         """Process each scraped item"""
@@ -48,55 +245,130 @@ class JobScraperPipeline:
         # Add timestamp when scraped
         adapter['scraped_at'] = datetime.now().isoformat()
         
+        self.buffer.append((
+            adapter.get('title'),
+            adapter.get('company'),
+            adapter.get('location'),
+            adapter.get('sector'),
+            adapter.get('description'),
+            adapter.get('salary'),
+            adapter.get('contract_type'),
+            adapter.get('posted_date'),
+            adapter.get('source_website'),
+            adapter.get('job_url'),
+            adapter.get('scraped_at'),
+            adapter.get('duplicate_of')
+        ))
+        
+        if len(self.buffer) >= self.batch_size:
+            self.flush(spider)
+        else:
+            self.flush_if_due(spider)
+        
+        return item
+    
+    def flush_if_due(self, spider):
+        """Flush the buffer if the time threshold has been reached"""
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush(spider)
+    
+    def flush(self, spider):
+        """Write all buffered items in a single transaction"""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        
+        rows, self.buffer = self.buffer, []
+        start = time.perf_counter()
         try:
             # Insert or ignore if URL already exists (avoid duplicates)
-            self.cur.execute('''
-                INSERT OR IGNORE INTO jobs (
-                    title, company, location, sector, description, 
-                    salary, contract_type, posted_date, source_website, 
-                    job_url, scraped_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                adapter.get('title'),
-                adapter.get('company'),
-                adapter.get('location'),
-                adapter.get('sector'),
-                adapter.get('description'),
-                adapter.get('salary'),
-                adapter.get('contract_type'),
-                adapter.get('posted_date'),
-                adapter.get('source_website'),
-                adapter.get('job_url'),
-                adapter.get('scraped_at')
-            ))
-            self.conn.commit()
-            
+            with self.conn:
+                self.cur.executemany(self.insert_sql, rows)
+                inserted = self.cur.rowcount
+            failed = 0
         except sqlite3.Error as e:
-            spider.logger.error(f"Database error: {e}")
+            # Retry row by row so only the offending items are lost
+            spider.logger.warning(f"Database error while flushing {len(rows)} items, retrying one by one: {e}")
+            if self.stats:
+                self.stats.inc_value('sqlite/flush_errors')
+            inserted, failed = self.insert_one_by_one(rows, spider)
         
-        return item
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if self.stats:
+            self.stats.inc_value('sqlite/flushes')
+            self.stats.inc_value('sqlite/items_written', inserted)
+            self.stats.inc_value('sqlite/items_ignored', len(rows) - inserted - failed)
+            self.stats.inc_value('sqlite/flush_time_ms_total', round(elapsed_ms, 3))
+            self.stats.max_value('sqlite/flush_time_ms_max', round(elapsed_ms, 3))
+            self.stats.max_value('sqlite/flush_batch_max', len(rows))
+        spider.logger.debug(f"Flushed {len(rows)} items ({inserted} new) in {elapsed_ms:.1f} ms")
+    
+    def insert_one_by_one(self, rows, spider):
+        """Insert rows in their own transactions after a failed batch; returns (inserted, failed)"""
+        inserted = failed = 0
+        for row in rows:
+            try:
+                with self.conn:
+                    self.cur.execute(self.insert_sql, row)
+                    inserted += self.cur.rowcount
+            except sqlite3.Error as e:
+                spider.logger.error(f"Database error while saving {row[9]}: {e}")
+                failed += 1
+        if self.stats:
+            self.stats.inc_value('sqlite/items_failed', failed)
+        return inserted, failed
 
 
-class JsonWriterPipeline:
+class NdjsonExportPipeline:
     """
-    Pipeline to write scraped items to a JSON file
+    Pipeline to export scraped items as NDJSON files (one JSON object per line)
+
+    Files are written per spider to NDJSON_EXPORT_DIR, compressed with gzip
+    or zstd (NDJSON_EXPORT_COMPRESSION), rotated every NDJSON_EXPORT_MAX_ITEMS
+    items or NDJSON_EXPORT_MAX_BYTES bytes and appended to across runs.
+    Read them back with backend/export_reader.py.
     """
     
+    def __init__(self, directory='exports', compression='gzip', max_items=50000,
+                 max_bytes=64 * 1024 * 1024, buffer_items=500, stats=None):
+        if compression == 'zstd' and zstandard is None:
+            raise NotConfigured("NDJSON_EXPORT_COMPRESSION = 'zstd' requires the zstandard package")
+        self.directory = directory
+        self.compression = compression
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.buffer_items = buffer_items
+        self.stats = stats
+        self.writer = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            directory=settings.get('NDJSON_EXPORT_DIR', 'exports'),
+            compression=settings.get('NDJSON_EXPORT_COMPRESSION', 'gzip'),
+            max_items=settings.getint('NDJSON_EXPORT_MAX_ITEMS', 50000),
+            max_bytes=settings.getint('NDJSON_EXPORT_MAX_BYTES', 64 * 1024 * 1024),
+            buffer_items=settings.getint('NDJSON_EXPORT_BUFFER_ITEMS', 500),
+            stats=crawler.stats,
+        )
+    
     def open_spider(self, spider):
-        self.file = open('jobs.json', 'w', encoding='utf-8')
-        self.file.write('[')
-        self.first_item = True
+        self.writer = NdjsonWriter(
+            self.directory, spider.name, compression=self.compression, max_items=self.max_items,
+            max_bytes=self.max_bytes, buffer_items=self.buffer_items,
+        )
     
     def close_spider(self, spider):
-        self.file.write(']')
-        self.file.close()
+        self.writer.close()
+        if self.stats:
+            self.stats.set_value('ndjson/items_written', self.writer.items_written)
+            self.stats.set_value('ndjson/parts_opened', self.writer.parts_opened)
+        if self.writer.items_written:
+            spider.logger.info(
+                f"Exported {self.writer.items_written} items to {self.writer.part_path(self.writer.part)}"
+            )
     
     def process_item(self, item, spider):
-        if not self.first_item:
-            self.file.write(',\n')
-        else:
-            self.first_item = False
-        
-        line = json.dumps(dict(item), ensure_ascii=False, indent=2)
-        self.file.write(line)
-        return item
\ No newline at end of file
+        self.writer.write(ItemAdapter(item).asdict())
+        return item
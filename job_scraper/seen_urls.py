@@ -0,0 +1,54 @@
+import sqlite3
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+
+from w3lib.url import canonicalize_url
+
+
+def url_hash(url):
+    """Signed 64-bit hash of the canonical form of ``url``"""
+    digest = blake2b(canonicalize_url(url).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+class SeenUrls:
+    """
+    Set of job URLs already stored in jobs.db.
+    
+    URLs are kept as a sorted array of 64-bit hashes (8 bytes per job) and
+    looked up with a binary search. A collision would only make the crawl
+    skip one new job, with a probability of about n / 2**64.
+    """
+    
+    def __init__(self, hashes=()):
+        self.hashes = array('q', sorted(hashes))
+        self.added = set()
+    
+    @classmethod
+    def from_db(cls, db_path, source_website=None):
+        try:
+            conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        except sqlite3.OperationalError:
+            return cls()  # No database yet: nothing is known
+        try:
+            if source_website:
+                rows = conn.execute('SELECT job_url FROM jobs WHERE source_website = ?', (source_website,))
+            else:
+                rows = conn.execute('SELECT job_url FROM jobs')
+            return cls(url_hash(url) for (url,) in rows if url)
+        except sqlite3.OperationalError:
+            return cls()  # No jobs table yet
+        finally:
+            conn.close()
+    
+    def __len__(self):
+        return len(self.hashes) + len(self.added)
+    
+    def __contains__(self, url):
+        h = url_hash(url)
+        i = bisect_left(self.hashes, h)
+        return (i < len(self.hashes) and self.hashes[i] == h) or h in self.added
+    
+    def add(self, url):
+        self.added.add(url_hash(url))
@@ -1,3 +1,5 @@
+import os
+
 BOT_NAME = "job_scraper"
 
 SPIDER_MODULES = ["job_scraper.spiders"]
@@ -8,12 +10,32 @@ ROBOTSTXT_OBEY = False
 # Configure maximum concurrent requests
 CONCURRENT_REQUESTS = 16
 
-# Configure a delay for requests 
-DOWNLOAD_DELAY = 2
+# Starting delay and concurrency of each domain, tuned during the crawl by
+# AdaptiveConcurrency (see below)
+DOWNLOAD_DELAY = 1
 RANDOMIZE_DOWNLOAD_DELAY = True 
-CONCURRENT_REQUESTS_PER_DOMAIN = 4
+CONCURRENT_REQUESTS_PER_DOMAIN = 2
+
+# Per-domain AIMD control of concurrency and delay from latency, errors and 429/503
+EXTENSIONS = {
+    "job_scraper.extensions.AdaptiveConcurrency": 500,
+}
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_MIN_CONCURRENCY = 1
+ADAPTIVE_MAX_CONCURRENCY = 16
+ADAPTIVE_MIN_DELAY = 0.0
+ADAPTIVE_MAX_DELAY = 60.0
+ADAPTIVE_INTERVAL = 5.0        # Seconds per control window
+ADAPTIVE_ERROR_RATE = 0.1      # Back off above this share of failed requests
+ADAPTIVE_LATENCY_FACTOR = 3.0  # ... or when latency grows past 3x its lowest value
 
 
+# Selenium browser pool (BrowserFallbackMiddleware)
+SELENIUM_POOL_SIZE = 3                # Browsers per process = pages rendered in parallel
+SELENIUM_MAX_PAGES_PER_DRIVER = 50    # Recycle a browser after this many pages
+SELENIUM_PAGE_LOAD_TIMEOUT = 30       # Seconds before a stuck page load is abandoned
+SELENIUM_SCRIPT_TIMEOUT = 15
+
 # Disable cookies 
 COOKIES_ENABLED = True
 
@@ -34,20 +56,71 @@ SPIDER_MIDDLEWARES = {
 
 # Enable or disable downloader middlewares
 DOWNLOADER_MIDDLEWARES = {
-    "job_scraper.middlewares.JobScraperDownloaderMiddleware": 543,
+    # Between HttpCompression (590) and Retry (550): sees decompressed
+    # responses before challenge pages (403/503) are retried
+    "job_scraper.middlewares.BrowserFallbackMiddleware": 585,
 }
 
+# Persistent HTTP cache (.scrapy/httpcache/<spider>.sqlite): revisits are
+# sent as conditional requests and answered from the cache on 304
+HTTPCACHE_ENABLED = True
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_STORAGE = "job_scraper.httpcache.SqliteCacheStorage"
+HTTPCACHE_POLICY = "job_scraper.httpcache.RevalidatingPolicy"
+HTTPCACHE_ALWAYS_STORE = True
+HTTPCACHE_IGNORE_HTTP_CODES = [403, 404, 429, 500, 502, 503, 504]
+HTTPCACHE_MAX_BYTES = 512 * 1024 * 1024   # Least recently used pages are evicted above this
+HTTPCACHE_COMPRESSION_LEVEL = 6
+
+# Offline replay (HTTPCACHE_OFFLINE=1 scrapy crawl ...): every page comes from
+# the cache, requests missing from it are dropped and nothing is downloaded
+HTTPCACHE_OFFLINE = os.environ.get("HTTPCACHE_OFFLINE", "0") == "1"
+if HTTPCACHE_OFFLINE:
+    HTTPCACHE_POLICY = "scrapy.extensions.httpcache.DummyPolicy"
+    HTTPCACHE_IGNORE_MISSING = True
+
+# Render pages in a browser only for Cloudflare/JS challenges
+BROWSER_FALLBACK_ENABLED = not HTTPCACHE_OFFLINE
+
 # Configure item pipelines
 ITEM_PIPELINES = {
+    "job_scraper.pipelines.NearDuplicatePipeline": 200,
     "job_scraper.pipelines.JobScraperPipeline": 300,
-    # "job_scraper.pipelines.JsonWriterPipeline": 400,
+    # "job_scraper.pipelines.NdjsonExportPipeline": 400,
+}
+
+# NDJSON export (NdjsonExportPipeline): exports/<spider>-00001.ndjson.gz, ...
+NDJSON_EXPORT_DIR = "exports"
+NDJSON_EXPORT_COMPRESSION = "gzip"         # "none", "gzip" or "zstd" (needs the zstandard package)
+NDJSON_EXPORT_MAX_ITEMS = 50000            # Start a new file after this many items
+NDJSON_EXPORT_MAX_BYTES = 64 * 1024 * 1024 # ... or this many bytes of JSON
+NDJSON_EXPORT_BUFFER_ITEMS = 500           # Items buffered in memory between writes
+
+# Incremental crawl: skip job URLs already in SQLITE_DB_PATH and stop
+# paginating at the first listing page with only known jobs
+# (use -s INCREMENTAL_CRAWL=0 for a full crawl; offline replays are always full)
+INCREMENTAL_CRAWL = not HTTPCACHE_OFFLINE
+
+# SQLite storage (JobScraperPipeline)
+SQLITE_DB_PATH = "jobs.db"
+SQLITE_BATCH_SIZE = 100       # Flush after this many buffered items
+SQLITE_FLUSH_INTERVAL = 5.0   # ... or after this many seconds
+SQLITE_BUSY_TIMEOUT = 30.0    # Seconds to wait for a lock held by another process
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -20000,  # Negative value = size in KiB
 }
 
-# Enable and configure the AutoThrottle extension 
-AUTOTHROTTLE_ENABLED = True
-AUTOTHROTTLE_START_DELAY = 1
-AUTOTHROTTLE_MAX_DELAY = 3
-AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
+# Near-duplicate detection (NearDuplicatePipeline, see job_scraper/dedup.py):
+# duplicates are stored with duplicate_of = the first job's URL and skipped
+# by the backend indexer
+DEDUP_ENABLED = True
+DEDUP_THRESHOLD = 0.8         # Estimated Jaccard similarity of title + company + description shingles
+DEDUP_TITLE_THRESHOLD = 0.9   # ... and of the title words
+DEDUP_NUM_PERM = 128          # MinHash values per job
+DEDUP_BANDS = 16              # LSH bands, must divide DEDUP_NUM_PERM
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
@@ -1,19 +1,21 @@
 import scrapy
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 from job_scraper.items import JobItem
 from datetime import datetime
+from urllib.parse import urljoin
 import time
 
 
 class KeejobSpider(scrapy.Spider):
     """
     Scrapy spider for Keejob using Selenium to handle JavaScript and Cloudflare
+    
+    Listing pages are downloaded by Scrapy first. Only when the response is a
+    Cloudflare/JS challenge or contains no job articles does
+    BrowserFallbackMiddleware render it with a pooled headless browser,
+    calling render_page() below.
     """
     name = "keejob"
     allowed_domains = ["keejob.com", "www.keejob.com"]
@@ -21,81 +23,291 @@ class KeejobSpider(scrapy.Spider):
     
     custom_settings = {
         'ROBOTSTXT_OBEY': False,
-        'CONCURRENT_REQUESTS': 1,  # Only 1 at a time since we're using Selenium
     }
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        
-        # Setup Chrome options
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')  # Run in background
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option('useAutomationExtension', False)
-        chrome_options.add_argument('user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        
-        # Initialize driver
-        self.driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
-            options=chrome_options
-        )
-        
-        # Override webdriver detection
-        self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        
-        self.logger.info("✅ Selenium WebDriver initialized for Keejob spider")
+    # Readiness waits: adaptive timeouts instead of fixed sleeps
+    page_ready_timeout = 15         # Max seconds for the first articles to appear
+    max_scrolls = 10                # Maximum number of scrolls to try
+    max_jobs = 50                   # Stop scrolling once this many jobs are loaded
+    scroll_min_timeout = 1.0        # Bounds of the adaptive wait after each scroll
+    scroll_max_timeout = 8.0
+    scroll_quiet_ms = 300           # DOM must be quiet this long after new articles appear
+    
+    # Scrolls the page, then resolves as soon as new articles were added and
+    # the DOM went quiet, or when the timeout expires without growth.
+    WAIT_FOR_MORE_ARTICLES_JS = """
+        const [previousCount, timeoutMs, quietMs] = arguments;
+        const done = arguments[arguments.length - 1];
+        const count = () => document.querySelectorAll('article').length;
+        const start = performance.now();
+        let quietTimer = null;
+        let hardTimer = null;
+        const observer = new MutationObserver(() => {
+            if (count() > previousCount) {
+                clearTimeout(quietTimer);
+                quietTimer = setTimeout(finish, quietMs);
+            }
+        });
+        function finish() {
+            observer.disconnect();
+            clearTimeout(quietTimer);
+            clearTimeout(hardTimer);
+            done({count: count(), height: document.body.scrollHeight, waited: performance.now() - start});
+        }
+        observer.observe(document.body, {childList: true, subtree: true});
+        hardTimer = setTimeout(finish, timeoutMs);
+        window.scrollTo(0, document.body.scrollHeight);
+    """
+    
+    # Reads every field of every job article in one WebDriver round-trip
+    EXTRACT_ARTICLES_JS = """
+        const text = (root, selector) => {
+            const el = root.querySelector(selector);
+            return el ? el.innerText : null;
+        };
+        return Array.from(document.querySelectorAll('article')).map(article => {
+            const link = article.querySelector('a');
+            return {
+                title: text(article, 'h2'),
+                company: text(article, 'p.text-sm'),
+                tags: Array.from(article.querySelectorAll('span.inline-flex.items-center')).map(el => el.innerText),
+                description: text(article, 'div.mb-3'),
+                info: text(article, 'div.flex.flex-wrap.items-center.text-sm'),
+                job_url: link ? link.href : null,
+            };
+        });
+    """
+    
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        # Moving average of how long new articles take to show up after a scroll
+        spider.scroll_latency = None
+        return spider
+    
+    async def start(self):
+        for url in self.start_urls:
+            yield self.listing_request(url)
+    
+    def listing_request(self, url):
+        # Fetched over plain HTTP first; BrowserFallbackMiddleware renders the
+        # page in a browser if it is a challenge or has no job articles
+        return scrapy.Request(url, callback=self.parse, meta={'browser_required_css': 'article'})
     
     def parse(self, response):
         """
-        Use Selenium to load and parse the page
+        Parse a listing page, fetched over HTTP or rendered by a pooled browser
         """
-        self.driver.get(response.url)
-        time.sleep(5)  # Wait for page and Cloudflare to load
+        result = response.meta.get('browser_result')
+        if result:
+            self.record_timings(result['timings'])
+            items, page_urls = result['items'], result['page_urls']
+        else:
+            items = self.extract_articles_html(response)
+            page_urls = self.find_page_urls_html(response)
         
-        self.logger.info(f"✅ Page loaded: {self.driver.title}")
+        for item in items:
+            yield item
         
-        # Wait for job listings to appear
+        # Pagination pages are scheduled together so they are fetched in parallel
+        # (the dupefilter drops pages that were already requested)
+        for page_url in page_urls:
+            yield self.listing_request(page_url)
+    
+    def render_page(self, driver, url):
+        """
+        Load, scroll and extract one listing page in a browser
+        
+        Called by BrowserFallbackMiddleware from a worker thread with a pooled
+        driver; the returned dict is available as response.meta['browser_result'].
+        """
+        start = time.monotonic()
+        driver.get(url)
+        
+        # Wait for job listings to appear (also covers the Cloudflare check)
         try:
-            WebDriverWait(self.driver, 15).until(
+            WebDriverWait(driver, self.page_ready_timeout, poll_frequency=0.2).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "article"))
             )
         except:
             self.logger.warning("⚠️ Timeout waiting for job listings")
+        load_wait = time.monotonic() - start
+        
+        self.logger.info(f"✅ Page loaded in {load_wait:.1f}s: {driver.title}")
+        
+        scroll_wait, scrolls = self.scroll_to_load(driver)
+        
+        start = time.monotonic()
+        items, bulk = self.extract_articles(driver, url)
+        extract_time = time.monotonic() - start
+        
+        page_urls = self.find_page_urls(driver, url)
+        return {
+            'items': items,
+            'page_urls': page_urls,
+            'timings': {
+                'load': load_wait, 'scroll': scroll_wait, 'scrolls': scrolls,
+                'extract': extract_time, 'articles': len(items), 'bulk': bulk,
+            },
+        }
+    
+    def scroll_timeout(self):
+        """Adaptive wait after a scroll: a few times the usual latency, within bounds"""
+        if self.scroll_latency is None:
+            return self.scroll_max_timeout
+        return min(self.scroll_max_timeout, max(self.scroll_min_timeout, 3 * self.scroll_latency))
+    
+    def scroll_to_load(self, driver):
+        """
+        Scroll to load more jobs until the page stops growing
         
-        # Scroll to load more jobs (scroll multiple times to load more)
+        Returns the total time spent waiting and the number of scrolls.
+        """
         self.logger.info("📜 Scrolling to load more jobs...")
-        previous_height = 0
-        max_scrolls = 10  # Maximum number of scrolls to try
+        current_jobs = len(driver.find_elements(By.CSS_SELECTOR, "article"))
+        previous_height = driver.execute_script("return document.body.scrollHeight")
+        waited = 0.0
         
-        for i in range(max_scrolls):
-            # Scroll to bottom
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(3)  # Wait for new jobs to load
-            
-            # Calculate new scroll height and compare with previous
-            new_height = self.driver.execute_script("return document.body.scrollHeight")
+        for i in range(self.max_scrolls):
+            # Stop if we have enough jobs
+            if current_jobs >= self.max_jobs:
+                self.logger.info(f"✅ Loaded {current_jobs} jobs, stopping scroll")
+                return waited, i
             
-            # Count current jobs
-            current_jobs = len(self.driver.find_elements(By.CSS_SELECTOR, "article"))
-            self.logger.info(f"Scroll {i+1}/{max_scrolls}: {current_jobs} jobs loaded")
+            timeout = self.scroll_timeout()
+            result = driver.execute_async_script(
+                self.WAIT_FOR_MORE_ARTICLES_JS, current_jobs, int(timeout * 1000), self.scroll_quiet_ms
+            )
+            waited += result['waited'] / 1000
+            self.logger.info(f"Scroll {i+1}/{self.max_scrolls}: {result['count']} jobs loaded "
+                             f"in {result['waited'] / 1000:.2f}s")
             
-            # If we've reached the bottom (no new content loaded), stop
-            if new_height == previous_height:
+            # If nothing new was loaded, we've reached the bottom of the page
+            if result['count'] <= current_jobs and result['height'] == previous_height:
                 self.logger.info("📍 Reached bottom of page")
-                break
+                return waited, i + 1
             
-            previous_height = new_height
+            if result['count'] > current_jobs:
+                latency = max(0.0, result['waited'] / 1000 - self.scroll_quiet_ms / 1000)
+                self.scroll_latency = latency if self.scroll_latency is None else 0.8 * self.scroll_latency + 0.2 * latency
             
-            # Optional: stop if we have enough jobs (e.g., 50+)
-            if current_jobs >= 50:
-                self.logger.info(f"✅ Loaded {current_jobs} jobs, stopping scroll")
-                break
+            current_jobs = result['count']
+            previous_height = result['height']
+        
+        return waited, self.max_scrolls
+    
+    def record_timings(self, timings):
+        """
+        Per-page stats: wait times (next to what the former fixed sleeps would
+        have cost) and article extraction throughput
+        """
+        stats = self.crawler.stats
+        stats.inc_value('keejob/pages_rendered')
+        stats.inc_value('keejob/scrolls', timings['scrolls'])
+        stats.inc_value('keejob/load_wait_seconds', round(timings['load'], 3))
+        stats.inc_value('keejob/scroll_wait_seconds', round(timings['scroll'], 3))
+        stats.max_value('keejob/max_page_wait_seconds', round(timings['load'] + timings['scroll'], 3))
+        # Former behaviour: time.sleep(5) after load + time.sleep(3) per scroll
+        stats.inc_value('keejob/fixed_sleep_equivalent_seconds', 5 + 3 * max(timings['scrolls'], 1))
+        
+        stats.inc_value('keejob/articles_extracted', timings['articles'])
+        stats.inc_value('keejob/extract_seconds', round(timings['extract'], 4))
+        stats.inc_value('keejob/extract_bulk_pages' if timings['bulk'] else 'keejob/extract_fallback_pages')
+        extract_seconds = stats.get_value('keejob/extract_seconds')
+        if extract_seconds:
+            stats.set_value('keejob/articles_per_second',
+                            round(stats.get_value('keejob/articles_extracted') / extract_seconds, 1))
+    
+    def extract_articles(self, driver, page_url):
+        """
+        Build items from the job articles of the rendered page
+        
+        All fields are read with a single execute_script call; the
+        per-element path is kept as a fallback. Returns (items, bulk_used).
+        """
+        try:
+            records = driver.execute_script(self.EXTRACT_ARTICLES_JS)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Bulk extraction failed, falling back to per-element extraction: {e}")
+            records = None
+        
+        if not isinstance(records, list):
+            return self.extract_articles_per_element(driver, page_url), False
+        
+        self.logger.info(f"📋 Found {len(records)} job listings")
+        items = []
+        for idx, record in enumerate(records, 1):
+            item = self.item_from_record(record, idx, page_url)
+            if item:
+                items.append(item)
+        return items, True
+    
+    def item_from_record(self, record, idx, page_url):
+        """Build an item from one record returned by EXTRACT_ARTICLES_JS"""
+        item = JobItem()
+        
+        # Extract job title (h2 tag)
+        if record.get('title') is None:
+            self.logger.warning(f"Job {idx}: No title found, skipping")
+            return None
+        item['title'] = record['title'].strip()
+        
+        # Extract company name
+        item['company'] = (record.get('company') or "N/A").strip()
+        
+        # Extract tags: first is usually sector/industry, second is contract type (CDI, CDD, Stage, etc.)
+        tags = record.get('tags') or []
+        item['sector'] = tags[0].strip() if len(tags) > 0 else None
+        item['contract_type'] = tags[1].strip() if len(tags) > 1 else None
+        
+        # Extract description
+        description = record.get('description')
+        item['description'] = description.strip() if description is not None else "No description available"
+        
+        # Extract location and date
+        info_text = record.get('info') or ''
+        item['location'] = info_text.split('•')[0].strip() if '•' in info_text else "Tunisia"
+        item['posted_date'] = info_text.split('•')[1].strip() if '•' in info_text else datetime.now().strftime('%d/%m/%Y')
+        
+        # Get job URL
+        item['job_url'] = record.get('job_url') or page_url
+        
+        item['salary'] = None
+        item['source_website'] = "keejob.com"
+        
+        return self.clean_item(item)
+    
+    def extract_articles_html(self, response):
+        """Build items from job articles present in server-rendered HTML"""
+        items = []
+        
+        def text(node, selector):
+            found = node.css(selector)
+            return found[0].xpath('string()').get() if found else None
+        
+        job_articles = response.css('article')
+        self.logger.info(f"📋 Found {len(job_articles)} job listings (HTTP)")
+        for idx, article in enumerate(job_articles, 1):
+            href = article.css('a::attr(href)').get()
+            record = {
+                'title': text(article, 'h2'),
+                'company': text(article, 'p.text-sm'),
+                'tags': [tag.xpath('string()').get() for tag in article.css('span.inline-flex.items-center')],
+                'description': text(article, 'div.mb-3'),
+                'info': text(article, 'div.flex.flex-wrap.items-center.text-sm'),
+                'job_url': response.urljoin(href) if href else None,
+            }
+            item = self.item_from_record(record, idx, response.url)
+            if item:
+                items.append(item)
+        return items
+    
+    def extract_articles_per_element(self, driver, page_url):
+        """Fallback extraction with one WebDriver call per field"""
+        items = []
         
         # Find all job articles
-        job_articles = self.driver.find_elements(By.CSS_SELECTOR, "article")
+        job_articles = driver.find_elements(By.CSS_SELECTOR, "article")
         self.logger.info(f"📋 Found {len(job_articles)} job listings")
         
         for idx, article in enumerate(job_articles, 1):
@@ -151,29 +363,49 @@ class KeejobSpider(scrapy.Spider):
                     link = article.find_element(By.CSS_SELECTOR, "a")
                     item['job_url'] = link.get_attribute('href')
                 except:
-                    item['job_url'] = response.url
+                    item['job_url'] = page_url
                 
                 item['salary'] = None
                 item['source_website'] = "keejob.com"
                 
-                # Clean and yield
+                # Clean and keep
                 item = self.clean_item(item)
                 if item:
-                    yield item
+                    items.append(item)
                 
             except Exception as e:
                 self.logger.error(f"Error scraping job {idx}: {e}")
                 continue
         
-        # Try to find and follow pagination (if exists)
+        return items
+    
+    def find_page_urls(self, driver, page_url):
+        """Next page plus every numbered pagination link visible on the page"""
+        urls = []
         try:
-            next_button = self.driver.find_element(By.CSS_SELECTOR, "a[rel='next'], button.next, a.next-page")
-            next_url = next_button.get_attribute('href')
-            if next_url:
-                self.logger.info(f"Following pagination: {next_url}")
-                yield scrapy.Request(next_url, callback=self.parse)
-        except:
+            links = driver.find_elements(By.CSS_SELECTOR, "a[rel='next'], a.next-page, nav a[href*='page='], a[href*='?page=']")
+            for link in links:
+                href = link.get_attribute('href')
+                if href:
+                    urls.append(urljoin(page_url, href))
+        except Exception as e:
+            self.logger.warning(f"Could not read pagination links: {e}")
+        
+        if urls:
+            self.logger.info(f"Following {len(set(urls))} pagination links")
+        else:
             self.logger.info("No more pages to scrape")
+        return list(dict.fromkeys(urls))
+    
+    def find_page_urls_html(self, response):
+        """Same as find_page_urls() for server-rendered HTML"""
+        hrefs = response.css("a[rel='next'], a.next-page, nav a[href*='page='], a[href*='?page=']").css('::attr(href)').getall()
+        urls = list(dict.fromkeys(response.urljoin(href) for href in hrefs if href))
+        if urls:
+            self.logger.info(f"Following {len(urls)} pagination links")
+        else:
+            self.logger.info("No more pages to scrape")
+        return urls
     
     def clean_item(self, item):
         """Clean and validate item data"""
@@ -195,8 +427,3 @@ class KeejobSpider(scrapy.Spider):
             item['description'] = 'No description available'
         
         return item
-    
-    def closed(self, reason):
-        """Close Selenium driver when spider closes"""
-        self.driver.quit()
-        self.logger.info("✅ Selenium WebDriver closed")
\ No newline at end of file
@@ -1,21 +1,48 @@
 import scrapy
+from job_scraper.extraction import Extractor, Field
 from job_scraper.items import JobItem
+from job_scraper.seen_urls import SeenUrls
 from datetime import datetime
 import re
 
 
+# Fields of a job detail page (comma-separated selectors are fallbacks)
+JOB_DETAILS = Extractor(
+    title=Field('h1::text, h2.job-title::text'),
+    company=Field('span.company-name::text, div.company::text, a.company-link::text'),
+    location=Field('span.location::text, div.location::text, i.fa-map-marker + span::text'),
+    sector=Field('span.category::text, div.sector::text, span.job-category::text'),
+    description=Field('div.job-description *::text, div.description *::text, div.content-body *::text', join=True),
+    salary=Field('span.salary::text, div.salary::text, i.fa-money + span::text'),
+    contract_type=Field('span.contract-type::text, span.type::text, span.job-type::text'),
+    posted_date=Field('span.date::text, time::text, span.posted-date::text'),
+)
+
+
 class TanitjobsSpider(scrapy.Spider):
     name = "tanitjobs"
     allowed_domains = ["tanitjobs.com", "www.tanitjobs.com"]
     start_urls = ["https://www.tanitjobs.com/jobs"]
     
-    # Custom settings to avoid being blocked
+    # Custom settings to avoid being blocked (request rate is set by AdaptiveConcurrency)
     custom_settings = {
         'ROBOTSTXT_OBEY': False,
-        'DOWNLOAD_DELAY': 2,
         'RANDOMIZE_DOWNLOAD_DELAY': True,
     }
     
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        
+        # Incremental mode: job URLs already in the database are not fetched again
+        spider.seen_urls = None
+        if crawler.settings.getbool('INCREMENTAL_CRAWL', True):
+            spider.seen_urls = SeenUrls.from_db(
+                crawler.settings.get('SQLITE_DB_PATH', 'jobs.db'), source_website='tanitjobs.com'
+            )
+            spider.logger.info(f"Incremental crawl: {len(spider.seen_urls)} known job URLs")
+        return spider
+    
     def parse(self, response):
         """
         Parse the main job listings page
@@ -25,6 +52,7 @@ class TanitjobsSpider(scrapy.Spider):
         
         self.logger.info(f"Found {len(job_listings)} job listings on page")
         
+        new_jobs = 0
         for job in job_listings:
             # Extract job URL from the link
             job_url = job.css('div.media-right a.link::attr(href)').get()
@@ -33,6 +61,14 @@ class TanitjobsSpider(scrapy.Spider):
                 # Make URL absolute if it's relative
                 job_url = response.urljoin(job_url)
                 
+                # Skip jobs we already have before their detail page is requested
+                if self.seen_urls is not None:
+                    if job_url in self.seen_urls:
+                        self.crawler.stats.inc_value('incremental/skipped_known')
+                        continue
+                    self.seen_urls.add(job_url)
+                new_jobs += 1
+                
                 # Extract basic info from listing
                 title = job.css('div.media-heading.listing-item__title::text').get()
                 date = job.css('div.listing-item__date::text').get()
@@ -44,6 +80,12 @@ class TanitjobsSpider(scrapy.Spider):
                     meta={'title': title, 'date': date}
                 )
         
+        # Listings are newest first: a page with only known jobs means the rest is known too
+        if self.seen_urls is not None and job_listings and not new_jobs:
+            self.logger.info(f"Only known jobs on {response.url}, stopping pagination")
+            self.crawler.stats.set_value('incremental/stopped_at', response.url)
+            return
+        
         # Follow pagination links
         next_page = response.css('a[rel="next"]::attr(href)').get()
         if next_page:
@@ -54,33 +96,11 @@ class TanitjobsSpider(scrapy.Spider):
         """
         Parse individual job detail page
         """
-        item = JobItem()
-        
-        # Get title from meta or from page
-        item['title'] = response.meta.get('title') or response.css('h1::text, h2.job-title::text').get()
-        
-        # Extract company - look for company name patterns
-        item['company'] = response.css('span.company-name::text, div.company::text, a.company-link::text').get()
-        
-        # Extract location
-        item['location'] = response.css('span.location::text, div.location::text, i.fa-map-marker + span::text').get()
-        
-        # Extract sector/category
-        item['sector'] = response.css('span.category::text, div.sector::text, span.job-category::text').get()
-        
-        # Extract description - get all text from description div
-        description_parts = response.css('div.job-description *::text, div.description *::text, div.content-body *::text').getall()
-        item['description'] = ' '.join([text.strip() for text in description_parts if text.strip()]).strip()
-        
-        # Extract salary
-        item['salary'] = response.css('span.salary::text, div.salary::text, i.fa-money + span::text').get()
-        
-        # Extract contract type
-        item['contract_type'] = response.css('span.contract-type::text, span.type::text, span.job-type::text').get()
-        
-        # Get date from meta or from page
-        item['posted_date'] = response.meta.get('date') or response.css('span.date::text, time::text, span.posted-date::text').get()
-        
+        # Title and date from the listing page take precedence over the page
+        fields = JOB_DETAILS.extract(
+            response, title=response.meta.get('title'), posted_date=response.meta.get('date')
+        )
+        item = JobItem(**fields)
         item['source_website'] = "tanitjobs.com"
         item['job_url'] = response.url
         
@@ -91,16 +111,8 @@ class TanitjobsSpider(scrapy.Spider):
     
     def clean_item(self, item):
         """
-        Clean and normalize extracted data
+        Clean and normalize extracted data (whitespace is already normalized by JOB_DETAILS)
         """
-        # Strip whitespace from all text fields
-        for field in item.fields:
-            if item.get(field):
-                if isinstance(item[field], str):
-                    item[field] = item[field].strip()
-                    # Remove multiple spaces and newlines
-                    item[field] = ' '.join(item[field].split())
-        
         # Clean up date format if needed
         if item.get('posted_date'):
             # Remove extra text like "Publié le" or similar
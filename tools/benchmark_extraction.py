@@ -0,0 +1,146 @@
+"""
+Offline benchmark of TanitjobsSpider.parse_job_details.
+
+Replays saved job detail pages through the per-field response.css()
+extraction the spider used before (baseline) and through the compiled
+JOB_DETAILS extractor, checks that both produce the same items and reports
+pages/sec for each.
+
+Pages come from the HTTP cache a crawl leaves in
+.scrapy/httpcache/tanitjobs.sqlite (the default), or from a directory of
+.html pages (the file name is used as the URL path), e.g. one saved from
+the cache with --save-fixtures to keep a fixed set across cache evictions:
+
+    scrapy crawl tanitjobs                    # fills the HTTP cache
+    python tools/benchmark_extraction.py
+    python tools/benchmark_extraction.py --save-fixtures fixtures/tanitjobs
+    python tools/benchmark_extraction.py --fixtures fixtures/tanitjobs
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy import Request
+from scrapy.http import HtmlResponse
+
+from job_scraper.items import JobItem
+from job_scraper.spiders.tanitjobs import TanitjobsSpider
+
+
+def baseline_parse_job_details(response):
+    """parse_job_details and clean_item as they were before JOB_DETAILS"""
+    item = JobItem()
+    item['title'] = response.meta.get('title') or response.css('h1::text, h2.job-title::text').get()
+    item['company'] = response.css('span.company-name::text, div.company::text, a.company-link::text').get()
+    item['location'] = response.css('span.location::text, div.location::text, i.fa-map-marker + span::text').get()
+    item['sector'] = response.css('span.category::text, div.sector::text, span.job-category::text').get()
+    description_parts = response.css('div.job-description *::text, div.description *::text, div.content-body *::text').getall()
+    item['description'] = ' '.join([text.strip() for text in description_parts if text.strip()]).strip()
+    item['salary'] = response.css('span.salary::text, div.salary::text, i.fa-money + span::text').get()
+    item['contract_type'] = response.css('span.contract-type::text, span.type::text, span.job-type::text').get()
+    item['posted_date'] = response.meta.get('date') or response.css('span.date::text, time::text, span.posted-date::text').get()
+    item['source_website'] = "tanitjobs.com"
+    item['job_url'] = response.url
+
+    for field in item.fields:
+        if item.get(field):
+            if isinstance(item[field], str):
+                item[field] = item[field].strip()
+                item[field] = ' '.join(item[field].split())
+    if item.get('posted_date'):
+        date_match = re.search(r'\d{1,2}/\d{1,2}/\d{4}', item['posted_date'])
+        if date_match:
+            item['posted_date'] = date_match.group()
+    return item
+
+
+def load_fixtures(directory):
+    pages = []
+    for path in sorted(Path(directory).glob('*.html')):
+        pages.append((f'https://www.tanitjobs.com/job/{path.stem}/', path.read_bytes()))
+    return pages
+
+
+def load_cache(path, url_pattern):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    rows = conn.execute('SELECT url, body FROM responses WHERE status = 200').fetchall()
+    conn.close()
+    return [(url, zlib.decompress(body)) for url, body in rows if url_pattern in url]
+
+
+def save_fixtures(pages, directory):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for url, body in pages:
+        name = re.sub(r'[^\w.-]+', '_', url.rstrip('/').rsplit('/job/', 1)[-1]) or 'index'
+        (directory / f'{name}.html').write_bytes(body)
+
+
+def run(parse, pages, repeat):
+    """Pages/sec of ``parse`` (HTML parsing included) and the items of the last round"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        items = []
+        for url, body in pages:
+            response = HtmlResponse(url, body=body, encoding='utf-8', request=Request(url))
+            items.append(dict(parse(response)))
+    elapsed = time.perf_counter() - started
+    return len(pages) * repeat / elapsed, items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Tanitjobs detail page extraction")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--fixtures', help="Directory of saved .html detail pages")
+    source.add_argument('--cache', default='.scrapy/httpcache/tanitjobs.sqlite', help="SQLite HTTP cache of a crawl")
+    parser.add_argument('--url-pattern', default='/job/', help="Detail page URLs in the cache contain this")
+    parser.add_argument('--save-fixtures', metavar='DIR', help="Save the cached pages to DIR as .html and exit")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        pages = load_fixtures(args.fixtures)
+    elif os.path.exists(args.cache):
+        pages = load_cache(args.cache, args.url_pattern)
+    else:
+        sys.exit(f"No HTTP cache at {args.cache}: run `scrapy crawl tanitjobs` first or pass --fixtures")
+    if not pages:
+        sys.exit("No pages to benchmark")
+    if args.save_fixtures:
+        save_fixtures(pages, args.save_fixtures)
+        print(f"Saved {len(pages)} pages to {args.save_fixtures}")
+        return
+
+    spider = TanitjobsSpider()
+    compiled = lambda response: next(spider.parse_job_details(response))
+
+    # Warm-up: parser and selector caches
+    run(baseline_parse_job_details, pages[:10], 1)
+    run(compiled, pages[:10], 1)
+
+    before, baseline_items = run(baseline_parse_job_details, pages, args.repeat)
+    after, compiled_items = run(compiled, pages, args.repeat)
+
+    # The baseline fills the date with today's date later in clean_item: compare the rest
+    mismatches = 0
+    for old, new in zip(baseline_items, compiled_items):
+        for field, value in old.items():
+            if value and new.get(field) != value and field != 'posted_date':
+                mismatches += 1
+                print(f"Mismatch on {old['job_url']} {field}: {value!r} != {new.get(field)!r}")
+
+    print(f"{len(pages)} pages x {args.repeat}")
+    print(f"  before (response.css per field): {before:8.1f} pages/sec")
+    print(f"  after  (compiled JOB_DETAILS):   {after:8.1f} pages/sec  ({after / before:.2f}x)")
+    print(f"  field mismatches: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Local harness for the AdaptiveConcurrency extension.
+
+Starts a fake job board on 127.0.0.1 that accepts --rate requests per second
+(token bucket) and answers 429 with Retry-After above it, with a latency that
+grows with the number of requests in flight. A small spider crawls it with the
+project settings and the per-window series from the crawl stats is printed.
+
+Usage:
+    python tools/rate_limit_harness.py --rate 10 --pages 40
+    python tools/rate_limit_harness.py --static   # fixed delay/concurrency, for comparison
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scrapy
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+
+class FakeJobBoard(BaseHTTPRequestHandler):
+    rate = 10.0
+    jobs_per_page = 10
+    pages = 40
+    lock = threading.Lock()
+    tokens = 10.0
+    last_refill = time.monotonic()
+    in_flight = 0
+    served = 0
+    throttled = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    @classmethod
+    def take_token(cls):
+        with cls.lock:
+            now = time.monotonic()
+            cls.tokens = min(cls.rate, cls.tokens + (now - cls.last_refill) * cls.rate)
+            cls.last_refill = now
+            if cls.tokens < 1:
+                cls.throttled += 1
+                return False
+            cls.tokens -= 1
+            cls.in_flight += 1
+            return True
+
+    def do_GET(self):
+        cls = type(self)
+        if not cls.take_token():
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            return
+        try:
+            time.sleep(0.05 + 0.02 * cls.in_flight)
+            if self.path.startswith('/jobs'):
+                page = int(self.path.rsplit('=', 1)[-1]) if '=' in self.path else 1
+                links = ''.join(
+                    f'<a class="job" href="/job/{page}-{i}">Job {page}-{i}</a>' for i in range(cls.jobs_per_page)
+                )
+                if page < cls.pages:
+                    links += f'<a rel="next" href="/jobs?page={page + 1}">Next</a>'
+                body = f'<html><body>{links}</body></html>'
+            else:
+                body = f'<html><body><h1>{self.path}</h1><p>{"Lorem ipsum " * 200}</p></body></html>'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.end_headers()
+            self.wfile.write(body.encode('utf-8'))
+            with cls.lock:
+                cls.served += 1
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+class HarnessSpider(scrapy.Spider):
+    name = 'rate_limit_harness'
+
+    def __init__(self, port, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.start_urls = [f'http://127.0.0.1:{port}/jobs?page=1']
+
+    def parse(self, response):
+        yield from response.follow_all(css='a.job', callback=self.parse_job)
+        yield from response.follow_all(css='a[rel="next"]', callback=self.parse)
+
+    def parse_job(self, response):
+        yield {'url': response.url, 'title': response.css('h1::text').get()}
+
+
+def print_series(stats):
+    for key in sorted(k for k in stats if k.endswith('/series')):
+        print(f"\n{key}")
+        print(f"{'t (s)':>7} {'conc':>5} {'delay':>6} {'resp/s':>7} {'lat ms':>7} {'429':>4} {'err':>4}")
+        for w in stats[key]:
+            bar = '#' * int(round(w['responses_per_sec']))
+            print(f"{w['t']:>7} {w['concurrency']:>5} {w['delay']:>6} {w['responses_per_sec']:>7} "
+                  f"{w['latency_ms']:>7} {w['throttled']:>4} {w['errors']:>4} {bar}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl a rate-limited fake job board")
+    parser.add_argument('--rate', type=float, default=10.0, help="Requests per second accepted by the server")
+    parser.add_argument('--pages', type=int, default=40, help="Listing pages (10 jobs each)")
+    parser.add_argument('--interval', type=float, default=1.0, help="ADAPTIVE_INTERVAL for the run")
+    parser.add_argument('--static', action='store_true', help="Disable AdaptiveConcurrency")
+    args = parser.parse_args()
+
+    FakeJobBoard.rate = FakeJobBoard.tokens = args.rate
+    FakeJobBoard.pages = args.pages
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeJobBoard)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings = get_project_settings()
+    settings.update({
+        'ITEM_PIPELINES': {},
+        'HTTPCACHE_ENABLED': False,
+        'BROWSER_FALLBACK_ENABLED': False,
+        'ADAPTIVE_CONCURRENCY_ENABLED': not args.static,
+        'ADAPTIVE_INTERVAL': args.interval,
+        'RETRY_TIMES': 5,
+        'LOG_LEVEL': 'WARNING',
+    })
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(HarnessSpider)
+    process.crawl(crawler, port=server.server_address[1])
+    started = time.monotonic()
+    process.start()
+    elapsed = time.monotonic() - started
+    server.shutdown()
+
+    stats = crawler.stats.get_stats()
+    items = stats.get('item_scraped_count', 0)
+    expected = args.pages * FakeJobBoard.jobs_per_page
+    print(f"{'static' if args.static else 'adaptive'}: {items}/{expected} jobs in {elapsed:.1f}s "
+          f"({items / elapsed:.1f} jobs/s), {FakeJobBoard.throttled} requests throttled by the server")
+    print_series(stats)
+
+
+if __name__ == '__main__':
+    main()